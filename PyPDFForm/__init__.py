@@ -3,4 +3,5 @@
 
 __version__ = "1.4.8"
 
+from .core.font import FontScope
 from .wrapper import PdfWrapper, PyPDFForm
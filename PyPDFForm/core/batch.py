@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Contains helpers for filling a PDF form with many records."""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from copy import copy
+from multiprocessing.context import BaseContext
+from os import cpu_count
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from ..middleware.constants import WIDGET_TYPES
+from ..middleware.template import set_character_x_paddings, set_widget_values
+from .filler import fill_flattened, get_fill_actions, get_fill_plan
+from .font import FontScope, get_registered_fonts, register_font
+from .template import TemplateIndex, get_template_index
+from .utils import get_chunks
+from .watermark import merge_watermarks_with_pdf_copies
+
+_worker_state = {}
+
+
+def get_record_widgets(
+    template: TemplateIndex,
+    widgets: Dict[str, WIDGET_TYPES],
+    record: Dict[str, Union[str, bool, int]],
+    font_scope: FontScope,
+) -> Dict[str, WIDGET_TYPES]:
+    """Returns a copy of the widgets filled with a record."""
+
+    return set_widget_values(
+        template,
+        {key: copy(value) for key, value in widgets.items()},
+        record,
+        font_scope,
+    )
+
+
+def get_drawn_widgets(
+    template: TemplateIndex,
+    widgets: Dict[str, WIDGET_TYPES],
+    font_scope: FontScope,
+) -> Dict[str, WIDGET_TYPES]:
+    """Returns the widgets of a record ready to be drawn with their resolved fonts."""
+
+    return set_character_x_paddings(template, font_scope.resolve_widgets(widgets))
+
+
+def fill_record(
+    template: TemplateIndex,
+    widgets: Dict[str, WIDGET_TYPES],
+    record: Dict[str, Union[str, bool, int]],
+    font_scope: FontScope,
+) -> Tuple[bytes, Dict[str, WIDGET_TYPES]]:
+    """Fills a copy of the widgets with a record without changing the originals."""
+
+    _widgets = get_record_widgets(template, widgets, record, font_scope)
+
+    return (
+        fill_flattened(template, get_drawn_widgets(template, _widgets, font_scope)),
+        _widgets,
+    )
+
+
+def fill_records_combined(
+    template: TemplateIndex,
+    widgets: Dict[str, WIDGET_TYPES],
+    records: Iterable[Dict[str, Union[str, bool, int]]],
+    chunk_size: int,
+    font_scope: FontScope,
+) -> bytes:
+    """Fills the template once for each record into a single PDF."""
+
+    return merge_watermarks_with_pdf_copies(
+        get_fill_plan(template).flattened_stream,
+        (
+            get_fill_actions(
+                template,
+                get_drawn_widgets(
+                    template,
+                    get_record_widgets(template, widgets, record, font_scope),
+                    font_scope,
+                ),
+            )
+            for record in records
+        ),
+        template.page_sizes,
+        chunk_size,
+    )
+
+
+def init_worker(
+    template_stream: bytes,
+    widgets: Dict[str, WIDGET_TYPES],
+    font_scope: FontScope,
+    fonts: List[Tuple[str, bytes, str]],
+) -> None:
+    """
+    Parses the template once when a worker process starts and registers the
+    fonts of the parent process, which a spawned worker does not inherit.
+    """
+
+    for font_name, ttf_stream, digest in fonts:
+        register_font(font_name, ttf_stream, lazy=True, digest=digest)
+
+    _worker_state["template"] = get_template_index(template_stream)
+    _worker_state["widgets"] = widgets
+    _worker_state["font_scope"] = font_scope
+
+
+def fill_chunk(
+    records: List[Dict[str, Union[str, bool, int]]],
+) -> List[Tuple[bytes, Dict[str, WIDGET_TYPES]]]:
+    """Fills the template of the current worker process with a chunk of records."""
+
+    return [
+        fill_record(
+            _worker_state["template"],
+            _worker_state["widgets"],
+            record,
+            _worker_state["font_scope"],
+        )
+        for record in records
+    ]
+
+
+def fill_in_parallel(
+    template_stream: bytes,
+    widgets: Dict[str, WIDGET_TYPES],
+    records: Iterable[Dict[str, Union[str, bool, int]]],
+    workers: Union[int, None],
+    *,
+    chunk_size: int,
+    ordered: bool,
+    font_scope: FontScope,
+    mp_context: Union[BaseContext, None] = None,
+) -> Iterator[Tuple[bytes, Dict[str, WIDGET_TYPES]]]:
+    """
+    Fills a template with records across worker processes, a chunk at a time,
+    yielding each filled stream with the filled widgets of its record.
+    """
+
+    workers = workers or cpu_count() or 1
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp_context,
+        initializer=init_worker,
+        initargs=(template_stream, widgets, font_scope, get_registered_fonts()),
+    ) as executor:
+        max_pending = workers * 2
+        chunks = get_chunks(records, chunk_size)
+        pending = deque()
+
+        for chunk in chunks:
+            pending.append(executor.submit(fill_chunk, chunk))
+            if len(pending) < max_pending:
+                continue
+
+            if ordered:
+                yield from pending.popleft().result()
+            else:
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                pending = deque(not_done)
+                for each in done:
+                    yield from each.result()
+
+        while pending:
+            yield from pending.popleft().result()
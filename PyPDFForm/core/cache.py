@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Contains the cache used for objects shared across the process."""
+
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Hashable, Union
+
+
+class LRUCache:
+    """A thread safe least recently used cache bounded by count and size."""
+
+    def __init__(self, max_count: int, max_size: Union[int, None] = None) -> None:
+        """Constructs an empty cache."""
+
+        self.max_count = max_count
+        self.max_size = max_size
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+
+        self._lock = RLock()
+        self._items = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of entries in the cache."""
+
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Checks if a key is cached without touching its recency."""
+
+        return key in self._items
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value of a key or None and records a hit or miss."""
+
+        with self._lock:
+            if not self.enabled or key not in self._items:
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key][0]
+
+    def put(self, key: Hashable, value: Any, size: int = 0) -> None:
+        """Caches a value and evicts the least recently used entries if needed."""
+
+        with self._lock:
+            if not self.enabled or (self.max_size is not None and size > self.max_size):
+                return
+
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+
+            self._items[key] = (value, size)
+            self.size += size
+            self._evict()
+
+    def resize(self, key: Hashable, size: int) -> None:
+        """Updates the size of a cached entry and evicts entries if needed."""
+
+        with self._lock:
+            if key not in self._items:
+                return
+
+            value, old_size = self._items[key]
+            self._items[key] = (value, size)
+            self.size += size - old_size
+            self._evict()
+
+    def _evict(self) -> None:
+        """Evicts the least recently used entries until within the bounds."""
+
+        while len(self._items) > self.max_count or (
+            self.max_size is not None and self.size > self.max_size
+        ):
+            self.size -= self._items.popitem(last=False)[1][1]
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        """Returns counters of the cache."""
+
+        with self._lock:
+            total = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0,
+                "count": len(self._items),
+                "size": self.size,
+            }
@@ -23,8 +23,9 @@ MULTILINE = 1 << 12
 COMB = 1 << 24
 
 FONT_SIZE_IDENTIFIER = "Tf"
-FONT_COLOR_IDENTIFIER = " rg"
+COLOR_OPERATORS = {"g": ("gray", 1), "rg": ("rgb", 3), "k": ("cmyk", 4)}
 DEFAULT_FONT = "Helvetica"
+SHARED_FONT_PREFIX = "PyPDFForm-"
 DEFAULT_FONT_SIZE = 12
 DEFAULT_FONT_COLOR = (0, 0, 0)
 PREVIEW_FONT_COLOR = (1, 0, 0)
@@ -40,3 +41,38 @@ BUTTON_STYLES = {
 }
 
 COORDINATE_GRID_MARGIN = 100
+
+TEMPLATE_CACHE_MAX_COUNT = 64
+TEMPLATE_CACHE_MAX_SIZE = 256 * 1024 * 1024
+LAYOUT_CACHE_MAX_COUNT = 4096
+IMAGE_CACHE_MAX_COUNT = 64
+TEXT_APPEARANCE_CACHE_MAX_COUNT = 4096
+FONT_TOKEN_INDEX_MAX_COUNT = 1024
+IMAGE_CACHE_MAX_SIZE = 256 * 1024 * 1024
+LOSSLESS_IMAGE_FORMATS = ("PNG", "JPEG")
+
+DEFAULT_BATCH_CHUNK_SIZE = 32
+TEMPLATE_XOBJECT_NAME = "/PyPDFFormTemplate"
+COPIED_PAGE_ATTRIBUTES = (
+    "/MediaBox",
+    "/CropBox",
+    "/BleedBox",
+    "/TrimBox",
+    "/ArtBox",
+    "/BoxColorInfo",
+    "/Rotate",
+    "/UserUnit",
+    "/Group",
+    "/Tabs",
+    "/Trans",
+    "/Dur",
+    "/PZ",
+    "/VP",
+    "/Metadata",
+    "/PieceInfo",
+    "/LastModified",
+)
+
+DEFAULT_MIN_FONT_SIZE = 4
+AUTO_FONT_SIZE_STEP = 0.1
+LEADING_RATIO = 1.2
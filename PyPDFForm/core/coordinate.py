@@ -1,40 +1,27 @@
 # -*- coding: utf-8 -*-
 """Contains helpers for coordinates calculations."""
 
-from copy import deepcopy
-from typing import List, Tuple, Union
-
-from pypdf import PdfReader
-from reportlab.pdfbase.pdfmetrics import stringWidth
+from typing import Dict, List, Tuple, Union
 
 from ..middleware.text import Text
-from .constants import (ANNOTATION_RECTANGLE_KEY, COORDINATE_GRID_MARGIN,
-                        DEFAULT_FONT, DEFAULT_FONT_SIZE)
-from .template import (get_char_rect_width, get_widget_alignment,
-                       is_text_multiline)
-from .utils import stream_to_io
-from .watermark import create_watermarks_and_draw, merge_watermarks_with_pdf
+from .constants import COORDINATE_GRID_MARGIN, DEFAULT_FONT, DEFAULT_FONT_SIZE
+from .descriptor import WidgetDescriptor
+from .metrics import get_glyph_widths, text_width
+from .template import get_char_rect_width, memoize_layout
 
 
 def get_draw_checkbox_radio_coordinates(
-    widget: dict,
+    widget: WidgetDescriptor,
     widget_middleware: Text,
 ) -> Tuple[Union[float, int], Union[float, int]]:
     """Returns coordinates to draw at given a PDF form checkbox/radio widget."""
 
     string_height = widget_middleware.font_size * 96 / 72
-    width_mid_point = (
-        float(widget[ANNOTATION_RECTANGLE_KEY][0])
-        + float(widget[ANNOTATION_RECTANGLE_KEY][2])
-    ) / 2
-    height_mid_point = (
-        float(widget[ANNOTATION_RECTANGLE_KEY][1])
-        + float(widget[ANNOTATION_RECTANGLE_KEY][3])
-    ) / 2
+    width_mid_point, height_mid_point = widget.mid_point
 
     return (
         width_mid_point
-        - stringWidth(
+        - text_width(
             widget_middleware.value,
             widget_middleware.font,
             widget_middleware.font_size,
@@ -44,16 +31,23 @@ def get_draw_checkbox_radio_coordinates(
     )
 
 
-def get_draw_text_coordinates(
-    widget: dict, widget_middleware: Text
-) -> Tuple[Union[float, int], Union[float, int]]:
-    """Returns coordinates to draw text at given a PDF form text widget."""
+def get_draw_text_y_coordinate(
+    widget: WidgetDescriptor, font_size: Union[float, int]
+) -> Union[float, int]:
+    """Returns the baseline to draw text at given a PDF form text widget."""
+
+    string_height = font_size * 96 / 72
+    if widget.multiline:
+        return widget.rect[3] - string_height / 1.5
+
+    height_mid_point = widget.mid_point[1]
+    return (height_mid_point - string_height / 2 + height_mid_point) / 2
 
-    if widget_middleware.preview:
-        return (
-            float(widget[ANNOTATION_RECTANGLE_KEY][0]),
-            float(widget[ANNOTATION_RECTANGLE_KEY][3]) + 5,
-        )
+
+def get_draw_text_x_coordinate(
+    widget: WidgetDescriptor, widget_middleware: Text
+) -> Union[float, int]:
+    """Returns the x coordinate to draw text at given a PDF form text widget."""
 
     text_value = widget_middleware.value or ""
     length = (
@@ -66,27 +60,35 @@ def get_draw_text_coordinates(
     if widget_middleware.text_wrap_length is not None:
         text_value = text_value[: widget_middleware.text_wrap_length]
 
+    return get_aligned_text_x_coordinate(widget, widget_middleware, text_value, length)
+
+
+def get_aligned_text_x_coordinate(
+    widget: WidgetDescriptor,
+    widget_middleware: Text,
+    text_value: str,
+    length: int,
+) -> Union[float, int]:
+    """Returns the x coordinate to draw a text at by the widget's alignment."""
+
     character_paddings = (
         widget_middleware.character_paddings[:length]
         if widget_middleware.character_paddings is not None
         else widget_middleware.character_paddings
     )
 
-    alignment = get_widget_alignment(widget) or 0
-    x = float(widget[ANNOTATION_RECTANGLE_KEY][0])
+    alignment = widget.alignment
+    x = widget.rect[0]
 
     if int(alignment) != 0:
-        width_mid_point = (
-            float(widget[ANNOTATION_RECTANGLE_KEY][0])
-            + float(widget[ANNOTATION_RECTANGLE_KEY][2])
-        ) / 2
-        string_width = stringWidth(
+        width_mid_point = widget.mid_point[0]
+        string_width = text_width(
             text_value,
             widget_middleware.font,
             widget_middleware.font_size,
         )
         if widget_middleware.comb is True and length:
-            string_width = character_paddings[-1] + stringWidth(
+            string_width = character_paddings[-1] + text_width(
                 text_value[-1],
                 widget_middleware.font,
                 widget_middleware.font_size,
@@ -95,32 +97,23 @@ def get_draw_text_coordinates(
         if int(alignment) == 1:
             x = width_mid_point - string_width / 2
         elif int(alignment) == 2:
-            x = float(widget[ANNOTATION_RECTANGLE_KEY][2]) - string_width
+            x = widget.rect[2] - string_width
             if length > 0 and widget_middleware.comb is True:
                 x -= (
                     get_char_rect_width(widget, widget_middleware)
-                    - stringWidth(
+                    - text_width(
                         text_value[-1],
                         widget_middleware.font,
                         widget_middleware.font_size,
                     )
                 ) / 2
 
-    string_height = widget_middleware.font_size * 96 / 72
-    height_mid_point = (
-        float(widget[ANNOTATION_RECTANGLE_KEY][1])
-        + float(widget[ANNOTATION_RECTANGLE_KEY][3])
-    ) / 2
-    y = (height_mid_point - string_height / 2 + height_mid_point) / 2
-    if is_text_multiline(widget):
-        y = float(widget[ANNOTATION_RECTANGLE_KEY][3]) - string_height / 1.5
-
     if int(alignment) == 1 and widget_middleware.comb is True and length != 0:
         x -= character_paddings[0] / 2
         if length % 2 == 0:
             x -= (
                 character_paddings[0]
-                + stringWidth(
+                + text_width(
                     text_value[:1],
                     widget_middleware.font,
                     widget_middleware.font_size,
@@ -128,60 +121,86 @@ def get_draw_text_coordinates(
                 / 2
             )
 
+    return x
+
+
+def get_draw_text_coordinates(
+    widget: WidgetDescriptor, widget_middleware: Text
+) -> Tuple[Union[float, int], Union[float, int]]:
+    """Returns coordinates to draw text at given a PDF form text widget."""
+
+    if widget_middleware.preview:
+        return (
+            widget.rect[0],
+            widget.rect[3] + 5,
+        )
+
+    x = get_draw_text_x_coordinate(widget, widget_middleware)
+    y = get_draw_text_y_coordinate(widget, widget_middleware.font_size)
+
     return x, y
 
 
+@memoize_layout
 def get_text_line_x_coordinates(
-    widget: dict, widget_middleware: Text
+    widget: WidgetDescriptor, widget_middleware: Text
 ) -> Union[List[float], None]:
     """
     Returns the x coordinates to draw lines
     of the text at given a PDF form paragraph widget.
     """
 
-    if (
-        widget_middleware.text_wrap_length is not None
-        and widget_middleware.text_lines is not None
-        and len(widget_middleware.text_lines)
-        and isinstance(widget_middleware.value, str)
-        and len(widget_middleware.value) > widget_middleware.text_wrap_length
-    ):
-        result = []
-        _widget = deepcopy(widget_middleware)
-        for each in widget_middleware.text_lines:
-            _widget.value = each
-            _widget.text_wrap_length = None
-            result.append(get_draw_text_coordinates(widget, _widget)[0])
+    if not widget_middleware.text_lines or not isinstance(widget_middleware.value, str):
+        return None
 
-        return result
+    lines = widget_middleware.text_lines
+    if widget_middleware.max_length is not None:
+        lines = [line[: widget_middleware.max_length] for line in lines]
 
-    return None
+    alignment = int(widget.alignment)
+    if widget_middleware.preview or alignment not in (1, 2):
+        return [widget.rect[0]] * len(lines)
 
+    if widget_middleware.comb is True:
+        return [
+            get_aligned_text_x_coordinate(widget, widget_middleware, line, len(line))
+            for line in lines
+        ]
 
-def generate_coordinate_grid(pdf: bytes, color: Tuple[float, float, float]) -> bytes:
-    """Creates a grid view for the coordinates of a PDF."""
+    glyphs = get_glyph_widths(widget_middleware.font)
+    widths = [
+        glyphs.to_width(sum(map(glyphs.char_units, line)), widget_middleware.font_size)
+        for line in lines
+    ]
 
-    pdf_file = PdfReader(stream_to_io(pdf))
-    lines_by_page = {}
-    texts_by_page = {}
-    watermarks = []
+    if alignment == 1:
+        width_mid_point = widget.mid_point[0]
+        return [width_mid_point - each / 2 for each in widths]
 
-    for i, page in enumerate(pdf_file.pages):
-        lines_by_page[i + 1] = []
-        texts_by_page[i + 1] = []
-        width = float(page.mediabox[2])
-        height = float(page.mediabox[3])
+    return [widget.rect[2] - each for each in widths]
+
+
+def get_coordinate_grid_actions(
+    page_sizes: List[Tuple[float, float]], color: Tuple[float, float, float]
+) -> Dict[int, List[Tuple[str, list]]]:
+    """Returns actions drawing a grid view for the coordinates of each page."""
+
+    result = {}
+
+    for i, (width, height) in enumerate(page_sizes):
+        lines = []
+        texts = []
 
         r, g, b = color
 
         current = COORDINATE_GRID_MARGIN
         while current < width:
-            lines_by_page[i + 1].append([current, 0, current, height, r, g, b])
+            lines.append(("line", [current, 0, current, height, r, g, b]))
             current += COORDINATE_GRID_MARGIN
 
         current = COORDINATE_GRID_MARGIN
         while current < height:
-            lines_by_page[i + 1].append([0, current, width, current, r, g, b])
+            lines.append(("line", [0, current, width, current, r, g, b]))
             current += COORDINATE_GRID_MARGIN
 
         x = COORDINATE_GRID_MARGIN
@@ -193,26 +212,19 @@ def generate_coordinate_grid(pdf: bytes, color: Tuple[float, float, float]) -> b
                 text.font = DEFAULT_FONT
                 text.font_size = DEFAULT_FONT_SIZE
                 text.font_color = color
-                texts_by_page[i + 1].append(
-                    [
-                        text,
-                        x - stringWidth(value, DEFAULT_FONT, DEFAULT_FONT_SIZE),
-                        y - DEFAULT_FONT_SIZE,
-                    ]
+                texts.append(
+                    (
+                        "text",
+                        [
+                            text,
+                            x - text_width(value, DEFAULT_FONT, DEFAULT_FONT_SIZE),
+                            y - DEFAULT_FONT_SIZE,
+                        ],
+                    )
                 )
                 y += COORDINATE_GRID_MARGIN
             x += COORDINATE_GRID_MARGIN
 
-    for page, lines in lines_by_page.items():
-        watermarks.append(
-            create_watermarks_and_draw(pdf, page, "line", lines)[page - 1]
-        )
-
-    result = merge_watermarks_with_pdf(pdf, watermarks)
-    watermarks = []
-    for page, texts in texts_by_page.items():
-        watermarks.append(
-            create_watermarks_and_draw(pdf, page, "text", texts)[page - 1]
-        )
+        result[i + 1] = lines + texts
 
-    return merge_watermarks_with_pdf(result, watermarks)
+    return result
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Contains the descriptor of a widget extracted from a template."""
+
+from typing import Tuple
+
+
+class WidgetDescriptor:
+    """A class to represent every property of a template widget needed to fill it."""
+
+    __slots__ = (
+        "key",
+        "type",
+        "page",
+        "rect",
+        "multiline",
+        "comb",
+        "alignment",
+        "max_length",
+        "button_style",
+        "choices",
+        "font",
+        "font_size",
+        "font_color",
+    )
+
+    def __init__(
+        self,
+        key: str,
+        widget_type: type,
+        page: int,
+        rect: Tuple[float, float, float, float],
+    ) -> None:
+        """Constructs all attributes for the descriptor."""
+
+        self.key = key
+        self.type = widget_type
+        self.page = page
+        self.rect = rect
+        self.multiline = False
+        self.comb = False
+        self.alignment = 0
+        self.max_length = None
+        self.button_style = None
+        self.choices = None
+        self.font = None
+        self.font_size = None
+        self.font_color = None
+
+    @property
+    def width(self) -> float:
+        """Width of the widget's rectangle."""
+
+        return abs(self.rect[0] - self.rect[2])
+
+    @property
+    def height(self) -> float:
+        """Height of the widget's rectangle."""
+
+        return abs(self.rect[1] - self.rect[3])
+
+    @property
+    def mid_point(self) -> Tuple[float, float]:
+        """Center of the widget's rectangle."""
+
+        return (self.rect[0] + self.rect[2]) / 2, (self.rect[1] + self.rect[3]) / 2
@@ -1,71 +1,188 @@
 # -*- coding: utf-8 -*-
 """Contains helpers for filling a PDF form."""
 
-from typing import Dict
+from typing import Dict, List, Tuple, Union
 
 from ..middleware.checkbox import Checkbox
 from ..middleware.constants import WIDGET_TYPES
 from ..middleware.radio import Radio
+from ..middleware.text import Text
 from .coordinate import (get_draw_checkbox_radio_coordinates,
-                         get_draw_text_coordinates,
+                         get_draw_text_coordinates, get_draw_text_x_coordinate,
+                         get_draw_text_y_coordinate,
                          get_text_line_x_coordinates)
+from .descriptor import WidgetDescriptor
 from .font import checkbox_radio_font_size
-from .template import get_widget_key, get_widgets_by_page
+from .template import TemplateIndex, count_template_size
 from .utils import checkbox_radio_to_draw
-from .watermark import create_watermarks_and_draw, merge_watermarks_with_pdf
+from .watermark import merge_watermark_with_pdf
 
 
-def fill(
-    template_stream: bytes,
+def get_button_to_draw(
+    widget: WidgetDescriptor, button: Union[Checkbox, Radio]
+) -> Tuple[Text, float, float]:
+    """Returns the glyph to draw for a checkbox/radio widget and where to draw it."""
+
+    _to_draw = checkbox_radio_to_draw(button, checkbox_radio_font_size(widget))
+    x, y = get_draw_checkbox_radio_coordinates(widget, _to_draw)
+
+    return _to_draw, x, y
+
+
+class PlannedWidget:
+    """A class to represent how a template widget is drawn regardless of its value."""
+
+    __slots__ = ("widget", "occurrence", "button", "text_y")
+
+    def __init__(self, widget: WidgetDescriptor, occurrence: int) -> None:
+        """Precomputes everything that only depends on the template."""
+
+        self.widget = widget
+        self.occurrence = occurrence
+        self.button = None
+        self.text_y = None
+
+        if widget.type in (Checkbox, Radio):
+            button = widget.type(widget.key)
+            button.button_style = widget.button_style
+            self.button = get_button_to_draw(widget, button)
+        elif widget.font_size is not None:
+            self.text_y = get_draw_text_y_coordinate(widget, widget.font_size)
+
+    def button_to_draw(
+        self, button: Union[Checkbox, Radio]
+    ) -> Tuple[Text, float, float]:
+        """Returns the planned glyph unless the button middleware was customized."""
+
+        if (
+            self.button is not None
+            and isinstance(button, self.widget.type)
+            and button.button_style == self.widget.button_style
+        ):
+            return self.button
+
+        return get_button_to_draw(self.widget, button)
+
+    def text_coordinates(self, widget_middleware: Text) -> Tuple[float, float]:
+        """Returns coordinates to draw text at, reusing the planned baseline."""
+
+        if (
+            widget_middleware.preview
+            or self.text_y is None
+            or widget_middleware.font_size != self.widget.font_size
+        ):
+            return get_draw_text_coordinates(self.widget, widget_middleware)
+
+        return get_draw_text_x_coordinate(self.widget, widget_middleware), self.text_y
+
+
+class FillPlan:
+    """A class to represent the value independent part of filling a template."""
+
+    def __init__(self, template: TemplateIndex) -> None:
+        """Plans every widget of the template page by page."""
+
+        self.template = template
+        self.pages = {}
+        self._flattened_stream = None
+
+        occurrences = {}
+        for page, widgets in template.widgets_by_page.items():
+            self.pages[page] = []
+            for widget in widgets:
+                occurrence = occurrences.get(widget.key, 0)
+                occurrences[widget.key] = occurrence + 1
+                self.pages[page].append(PlannedWidget(widget, occurrence))
+
+    @property
+    def flattened_stream(self) -> bytes:
+        """The template without its widgets, shared by every fill of the plan."""
+
+        if self._flattened_stream is None:
+            self._flattened_stream = merge_watermark_with_pdf(
+                self.template.stream, {}, remove_widgets=True
+            )
+            count_template_size(self.template, len(self._flattened_stream))
+
+        return self._flattened_stream
+
+
+def get_fill_plan(template: TemplateIndex) -> FillPlan:
+    """Returns the fill plan of a template, compiling it on first use."""
+
+    if template.fill_plan is None:
+        template.fill_plan = FillPlan(template)
+
+    return template.fill_plan
+
+
+def get_fill_actions(
+    template: TemplateIndex,
     widgets: Dict[str, WIDGET_TYPES],
-) -> bytes:
-    """Fills a PDF using watermarks."""
+) -> Dict[int, List[Tuple[str, list]]]:
+    """Returns actions drawing the values of the widgets by page."""
 
     texts_to_draw = {}
-    text_watermarks = []
-
-    radio_button_tracker = {}
 
-    for page, _widgets in get_widgets_by_page(template_stream).items():
+    for page, planned in get_fill_plan(template).pages.items():
         texts_to_draw[page] = []
-        text_watermarks.append(b"")
-        for _widget in _widgets:
-            key = get_widget_key(_widget)
+        for each in planned:
+            _widget = each.widget
+            key = _widget.key
             needs_to_be_drawn = False
 
             if isinstance(widgets[key], (Checkbox, Radio)):
-                font_size = checkbox_radio_font_size(_widget)
-                _to_draw = checkbox_radio_to_draw(widgets[key], font_size)
-                x, y = get_draw_checkbox_radio_coordinates(_widget, _to_draw)
+                _to_draw, x, y = each.button_to_draw(widgets[key])
                 if isinstance(widgets[key], Checkbox) and widgets[key].value:
                     needs_to_be_drawn = True
                 elif isinstance(widgets[key], Radio):
-                    if key not in radio_button_tracker:
-                        radio_button_tracker[key] = 0
-                    radio_button_tracker[key] += 1
-                    if widgets[key].value == radio_button_tracker[key] - 1:
+                    if widgets[key].value == each.occurrence:
                         needs_to_be_drawn = True
             else:
                 widgets[key].text_line_x_coordinates = get_text_line_x_coordinates(
                     _widget, widgets[key]
                 )
-                x, y = get_draw_text_coordinates(_widget, widgets[key])
+                x, y = each.text_coordinates(widgets[key])
                 _to_draw = widgets[key]
                 needs_to_be_drawn = True
 
             if needs_to_be_drawn:
                 texts_to_draw[page].append(
-                    [
-                        _to_draw,
-                        x,
-                        y,
-                    ]
+                    (
+                        "text",
+                        [
+                            _to_draw,
+                            x,
+                            y,
+                        ],
+                    )
                 )
 
-    for page, texts in texts_to_draw.items():
-        _watermarks = create_watermarks_and_draw(template_stream, page, "text", texts)
-        for i, watermark in enumerate(_watermarks):
-            if watermark:
-                text_watermarks[i] = watermark
+    return texts_to_draw
+
+
+def fill(
+    template: TemplateIndex,
+    widgets: Dict[str, WIDGET_TYPES],
+) -> bytes:
+    """Fills a PDF using watermarks and removes all its widgets."""
+
+    return merge_watermark_with_pdf(
+        template.stream,
+        get_fill_actions(template, widgets),
+        template.page_sizes,
+        remove_widgets=True,
+    )
+
+
+def fill_flattened(
+    template: TemplateIndex,
+    widgets: Dict[str, WIDGET_TYPES],
+) -> bytes:
+    """Fills a PDF by drawing onto its cached widget free copy."""
 
-    return merge_watermarks_with_pdf(template_stream, text_watermarks)
+    return merge_watermark_with_pdf(
+        get_fill_plan(template).flattened_stream,
+        get_fill_actions(template, widgets),
+        template.page_sizes,
+    )
@@ -1,152 +1,394 @@
 # -*- coding: utf-8 -*-
 """Contains helpers for font."""
 
+import re
+from copy import copy
 from io import BytesIO
 from math import sqrt
-from re import findall
-from typing import Tuple, Union
+from sys import getsizeof
+from threading import RLock
+from typing import Dict, List, NamedTuple, Tuple, Union
 
 from reportlab.pdfbase.acroform import AcroForm
 from reportlab.pdfbase.pdfmetrics import registerFont, standardFonts
 from reportlab.pdfbase.ttfonts import TTFError, TTFont
 
-from .constants import (ANNOTATION_RECTANGLE_KEY, DEFAULT_FONT,
-                        DEFAULT_FONT_SIZE, FONT_COLOR_IDENTIFIER,
-                        FONT_SIZE_IDENTIFIER)
-from .patterns import TEXT_FIELD_APPEARANCE_PATTERNS
-from .template import is_text_multiline
-from .utils import traverse_pattern
+from ..middleware.constants import WIDGET_TYPES
+from ..middleware.text import Text
+from .cache import LRUCache
+from .constants import (COLOR_OPERATORS, DEFAULT_FONT, DEFAULT_FONT_SIZE,
+                        FONT_SIZE_IDENTIFIER, FONT_TOKEN_INDEX_MAX_COUNT,
+                        SHARED_FONT_PREFIX, TEXT_APPEARANCE_CACHE_MAX_COUNT)
+from .descriptor import WidgetDescriptor
+from .patterns import TEXT_FIELD_APPEARANCE_LOOKUP
+from .utils import get_digest, traverse_compiled_pattern
+
+FONT_LOCK = RLock()
+FONTS_BY_DIGEST = {}
+FONT_DIGESTS = {}
+LOADED_FONTS = set()
+FONT_SEGMENT_PATTERN = re.compile("[A-Z][^A-Z]*")
+STANDARD_FONT_SEGMENTS = [
+    (font, FONT_SEGMENT_PATTERN.findall(font.replace("-", "")))
+    for font in standardFonts
+]
+
+
+class RegisteredFont:
+    """A class to represent a TrueType font registered by the digest of its file."""
+
+    __slots__ = ("digest", "stream", "font")
+
+    def __init__(self, digest: str, stream: bytes) -> None:
+        """Keeps the file stream of the font until it is first used."""
+
+        self.digest = digest
+        self.stream = stream
+        self.font = None
+
+    def load(self, font_name: str) -> TTFont:
+        """Parses the font file once and returns the parsed font."""
+
+        if self.font is None:
+            buff = BytesIO()
+            buff.write(self.stream)
+            buff.seek(0)
+
+            try:
+                self.font = TTFont(name=font_name, filename=buff)
+            finally:
+                buff.close()
+            self.stream = None
+
+        return self.font
+
+    @property
+    def data(self) -> bytes:
+        """The file stream of the font, kept by the parsed font once loaded."""
+
+        if self.font is None:
+            return self.stream
+
+        return self.font.face._ttf_data  # pylint: disable=W0212
+
+    @property
+    def memory(self) -> int:
+        """Approximate number of bytes held by the font."""
+
+        if self.font is None:
+            return len(self.stream)
+
+        face = self.font.face
+        return len(face._ttf_data) + sum(  # pylint: disable=W0212
+            getsizeof(getattr(face, each, None))
+            for each in (
+                "charToGlyph",
+                "charWidths",
+                "glyphWidths",
+                "glyphNames",
+                "glyphPos",
+                "hmetrics",
+            )
+        )
+
+
+def register_font(
+    font_name: str,
+    ttf_stream: bytes,
+    lazy: bool = False,
+    digest: Union[str, None] = None,
+) -> bool:
+    """
+    Registers a font from a ttf file stream. Each distinct file is parsed
+    at most once, and only when first used if registered lazily.
+    """
 
+    digest = digest or get_digest(ttf_stream)
+    if FONT_DIGESTS.get(font_name) == digest:
+        return True
 
-def register_font(font_name: str, ttf_stream: bytes) -> bool:
-    """Registers a font from a ttf file stream."""
+    with FONT_LOCK:
+        if digest not in FONTS_BY_DIGEST:
+            FONTS_BY_DIGEST[digest] = RegisteredFont(digest, ttf_stream)
+        FONT_DIGESTS[font_name] = digest
+        LOADED_FONTS.discard(font_name)
 
-    buff = BytesIO()
-    buff.write(ttf_stream)
-    buff.seek(0)
+    if lazy:
+        return True
 
-    try:
-        registerFont(TTFont(name=font_name, filename=buff))
-        result = True
-    except TTFError:
-        result = False
+    result = load_font(font_name)
+    if not result:
+        with FONT_LOCK:
+            FONT_DIGESTS.pop(font_name, None)
+            if digest not in FONT_DIGESTS.values():
+                FONTS_BY_DIGEST.pop(digest)
 
-    buff.close()
     return result
 
 
-def auto_detect_font(widget: dict) -> str:
-    """Returns the font of the text field if it is one of the standard fonts."""
+def load_font(font_name: str) -> bool:
+    """Parses and registers a font registered by its file stream if not done yet."""
 
-    # pylint: disable=R0912
-    result = DEFAULT_FONT
+    if font_name in LOADED_FONTS:
+        return True
 
-    text_appearance = None
-    for pattern in TEXT_FIELD_APPEARANCE_PATTERNS:
-        text_appearance = traverse_pattern(pattern, widget)
+    digest = FONT_DIGESTS.get(font_name)
+    if digest is None:
+        return False
 
-        if text_appearance:
-            break
-
-    if not text_appearance:
-        return result
+    with FONT_LOCK:
+        if font_name in LOADED_FONTS:
+            return True
 
-    text_appearance = text_appearance.split(" ")
+        try:
+            font = FONTS_BY_DIGEST[digest].load(font_name)
+        except TTFError:
+            return False
 
-    for each in text_appearance:
-        if each.startswith("/"):
-            text_segments = findall("[A-Z][^A-Z]*", each.replace("/", ""))
+        if font.fontName != font_name:
+            font = copy(font)
+            font.fontName = font_name
+        registerFont(font)
+        LOADED_FONTS.add(font_name)
 
-            if len(text_segments) == 1:
-                for k, v in AcroForm.formFontNames.items():
-                    if v == text_segments[0]:
-                        return k
+    return True
 
-            for font in standardFonts:
-                font_segments = findall("[A-Z][^A-Z]*", font.replace("-", ""))
-                if len(font_segments) != len(text_segments):
-                    continue
 
-                found = True
-                for i, val in enumerate(font_segments):
-                    if not val.startswith(text_segments[i]):
-                        found = False
+def register_shared_font(ttf_stream: bytes, lazy: bool = False) -> Union[str, None]:
+    """
+    Registers a font under a name derived from the digest of its file,
+    so that every scope using the same file shares one parsed font.
+    """
 
-                if found:
-                    return font
+    digest = get_digest(ttf_stream)
+    font_name = f"{SHARED_FONT_PREFIX}{digest}"
 
-    return result
+    return font_name if register_font(font_name, ttf_stream, lazy, digest) else None
 
 
-def text_field_font_size(widget: dict) -> Union[float, int]:
+class FontScope:
     """
-    Calculates the font size it should be drawn with
-    given a text field widget.
+    A class to represent a namespace of font names resolving to shared fonts.
+    Registering copies the names on write, so resolving never takes a lock.
     """
 
-    if is_text_multiline(widget):
-        return DEFAULT_FONT_SIZE
+    __slots__ = ("fonts",)
+
+    def __init__(self) -> None:
+        """Constructs an empty namespace."""
+
+        self.fonts: Dict[str, str] = {}
+
+    def register(self, font_name: str, ttf_stream: bytes, lazy: bool = False) -> bool:
+        """Registers a font from a ttf file stream only within the namespace."""
+
+        shared_font_name = register_shared_font(ttf_stream, lazy)
+        if shared_font_name is None:
+            return False
+
+        with FONT_LOCK:
+            fonts = dict(self.fonts)
+            fonts[font_name] = shared_font_name
+            self.fonts = fonts
+
+        return True
+
+    def resolve(self, font_name: str) -> str:
+        """Returns the registered name of a font in the namespace."""
+
+        return self.fonts.get(font_name, font_name)
+
+    def resolve_widget(self, widget: WIDGET_TYPES) -> WIDGET_TYPES:
+        """
+        Returns a copy of a text field using a scoped font pointed at the
+        shared font, or the widget itself if it uses no scoped font.
+        """
+
+        fonts = self.fonts
+        if not isinstance(widget, Text) or widget.font not in fonts:
+            return widget
+
+        result = copy(widget)
+        result.font = fonts[widget.font]
+
+        return result
+
+    def resolve_widgets(
+        self, widgets: Dict[str, WIDGET_TYPES]
+    ) -> Dict[str, WIDGET_TYPES]:
+        """
+        Returns the widgets with copies of the text fields using scoped fonts
+        pointed at the shared fonts, leaving the given widgets unchanged.
+        """
+
+        if not self.fonts:
+            return widgets
+
+        return {key: self.resolve_widget(value) for key, value in widgets.items()}
+
+
+def get_registered_fonts() -> List[Tuple[str, bytes, str]]:
+    """Returns the name, file stream and digest of each registered font."""
+
+    with FONT_LOCK:
+        return [
+            (font_name, FONTS_BY_DIGEST[digest].data, digest)
+            for font_name, digest in FONT_DIGESTS.items()
+        ]
+
+
+def get_font_memory_usage() -> Dict[str, int]:
+    """Returns the approximate number of bytes held by each registered font."""
+
+    with FONT_LOCK:
+        return {
+            font_name: FONTS_BY_DIGEST[digest].memory
+            for font_name, digest in FONT_DIGESTS.items()
+        }
+
+
+def resolve_font_token(token: str) -> Union[str, None]:
+    """Returns the standard font a /DA font token, for example /Helv, is for."""
+
+    text_segments = FONT_SEGMENT_PATTERN.findall(token.replace("/", ""))
+
+    if len(text_segments) == 1:
+        for k, v in AcroForm.formFontNames.items():
+            if v == text_segments[0]:
+                return k
+
+    for font, font_segments in STANDARD_FONT_SEGMENTS:
+        if len(font_segments) == len(text_segments) and all(
+            val.startswith(text_segments[i]) for i, val in enumerate(font_segments)
+        ):
+            return font
+
+    return None
 
-    height = abs(
-        float(widget[ANNOTATION_RECTANGLE_KEY][1])
-        - float(widget[ANNOTATION_RECTANGLE_KEY][3])
-    )
 
-    return height * 2 / 3
+STANDARD_FONT_TOKENS = {
+    f"/{each}": resolve_font_token(f"/{each}")
+    for each in (*AcroForm.formFontNames.values(), "TiRo", "Symb")
+}
+FONT_TOKEN_INDEX = LRUCache(FONT_TOKEN_INDEX_MAX_COUNT)
+TEXT_APPEARANCES = LRUCache(TEXT_APPEARANCE_CACHE_MAX_COUNT)
 
 
-def checkbox_radio_font_size(widget: dict) -> Union[float, int]:
+def get_font_by_token(token: str) -> Union[str, None]:
+    """Looks up the standard font of a font token, indexing new tokens."""
+
+    if token in STANDARD_FONT_TOKENS:
+        return STANDARD_FONT_TOKENS[token]
+
+    result = FONT_TOKEN_INDEX.get(token)
+    if result is None:
+        result = (resolve_font_token(token),)
+        FONT_TOKEN_INDEX.put(token, result)
+
+    return result[0]
+
+
+class TextAppearance(NamedTuple):
+    """An immutable record of what a /DA string sets for a text field."""
+
+    font: Union[str, None] = None
+    font_size: Union[float, None] = None
+    color_space: Union[str, None] = None
+    color: Union[Tuple[float, ...], None] = None
+
+    @property
+    def font_color(self) -> Union[Tuple[float, float, float], None]:
+        """The color converted to an RGB tuple."""
+
+        if self.color_space == "gray":
+            return self.color * 3
+
+        if self.color_space == "cmyk":
+            color = self.color or ()
+            black = 1 - color[3]
+            return (
+                (1 - color[0]) * black,
+                (1 - color[1]) * black,
+                (1 - color[2]) * black,
+            )
+
+        return self.color
+
+
+def parse_text_appearance(text_appearance: str) -> TextAppearance:
     """
-    Calculates the font size it should be drawn with
-    given a checkbox/radio button widget.
+    Tokenizes a /DA string once and returns its font token, font size
+    and font color, memoized by the string.
     """
 
-    area = abs(
-        float(widget[ANNOTATION_RECTANGLE_KEY][0])
-        - float(widget[ANNOTATION_RECTANGLE_KEY][2])
-    ) * abs(
-        float(widget[ANNOTATION_RECTANGLE_KEY][1])
-        - float(widget[ANNOTATION_RECTANGLE_KEY][3])
-    )
+    result = TEXT_APPEARANCES.get(text_appearance)
+    if result is not None:
+        return result
+
+    font = font_size = color_space = color = None
+    name = None
+    numbers = []
+    for token in text_appearance.split():
+        if token.startswith("/"):
+            name, numbers = token, []
+            continue
+
+        try:
+            numbers.append(float(token))
+            continue
+        except ValueError:
+            pass
+
+        if token == FONT_SIZE_IDENTIFIER and name is not None and numbers:
+            font, font_size = name, numbers[-1]
+        elif token in COLOR_OPERATORS:
+            space, count = COLOR_OPERATORS[token]
+            if len(numbers) >= count:
+                color_space, color = space, tuple(numbers[-count:])
+        name, numbers = None, []
+
+    result = TextAppearance(font, font_size, color_space, color)
+    TEXT_APPEARANCES.put(text_appearance, result)
 
-    return sqrt(area) * 72 / 96
+    return result
 
 
-def get_text_field_font_size(widget: dict) -> Union[float, int]:
-    """Returns the font size of the text field if presented or zero."""
+def get_text_appearance(widget: dict) -> TextAppearance:
+    """Returns the parsed /DA of a text field or its parent."""
 
-    result = 0
-    for pattern in TEXT_FIELD_APPEARANCE_PATTERNS:
-        text_appearance = traverse_pattern(pattern, widget)
-        if text_appearance:
-            properties = text_appearance.split(" ")
-            for i, val in enumerate(properties):
-                if val.startswith(FONT_SIZE_IDENTIFIER):
-                    return float(properties[i - 1])
+    text_appearance = traverse_compiled_pattern(TEXT_FIELD_APPEARANCE_LOOKUP, widget)
 
-    return result
+    if not text_appearance:
+        return TextAppearance()
 
+    return parse_text_appearance(text_appearance)
 
-def get_text_field_font_color(
-    widget: dict,
-) -> Union[Tuple[float, float, float], None]:
-    """Returns the font color tuple of the text field if presented or black."""
-
-    result = (0, 0, 0)
-    for pattern in TEXT_FIELD_APPEARANCE_PATTERNS:
-        text_appearance = traverse_pattern(pattern, widget)
-        if text_appearance:
-            if FONT_COLOR_IDENTIFIER not in text_appearance:
-                return result
-
-            text_appearance = text_appearance.split(" ")
-            for i, val in enumerate(text_appearance):
-                if val.startswith(FONT_COLOR_IDENTIFIER.replace(" ", "")):
-                    result = (
-                        float(text_appearance[i - 3]),
-                        float(text_appearance[i - 2]),
-                        float(text_appearance[i - 1]),
-                    )
-                    break
 
-    return result
+def auto_detect_font(text_appearance: TextAppearance) -> str:
+    """Returns the font of the text field if it is one of the standard fonts."""
+
+    if text_appearance.font is None:
+        return DEFAULT_FONT
+
+    return get_font_by_token(text_appearance.font) or DEFAULT_FONT
+
+
+def text_field_font_size(widget: WidgetDescriptor) -> Union[float, int]:
+    """
+    Calculates the font size it should be drawn with
+    given a text field widget.
+    """
+
+    if widget.multiline:
+        return DEFAULT_FONT_SIZE
+
+    return widget.height * 2 / 3
+
+
+def checkbox_radio_font_size(widget: WidgetDescriptor) -> Union[float, int]:
+    """
+    Calculates the font size it should be drawn with
+    given a checkbox/radio button widget.
+    """
+
+    return sqrt(widget.width * widget.height) * 72 / 96
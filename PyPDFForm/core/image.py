@@ -5,6 +5,14 @@ from io import BytesIO
 from typing import Union
 
 from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+from .cache import LRUCache
+from .constants import (IMAGE_CACHE_MAX_COUNT, IMAGE_CACHE_MAX_SIZE,
+                        LOSSLESS_IMAGE_FORMATS)
+from .utils import get_digest
+
+IMAGE_CACHE = LRUCache(IMAGE_CACHE_MAX_COUNT, IMAGE_CACHE_MAX_SIZE)
 
 
 def rotate_image(image_stream: bytes, rotation: Union[float, int]) -> bytes:
@@ -28,8 +36,11 @@ def rotate_image(image_stream: bytes, rotation: Union[float, int]) -> bytes:
     return result
 
 
-def any_image_to_jpg(image_stream: bytes) -> bytes:
-    """Converts an image of any type to jpg."""
+def any_image_to_png_or_jpg(image_stream: bytes) -> bytes:
+    """
+    Keeps PNG and JPEG images untouched since PDF can embed them without
+    loss, and converts images of any other type to PNG.
+    """
 
     buff = BytesIO()
     buff.write(image_stream)
@@ -37,15 +48,57 @@ def any_image_to_jpg(image_stream: bytes) -> bytes:
 
     image = Image.open(buff)
 
-    if image.format == "JPEG":
+    if image.format in LOSSLESS_IMAGE_FORMATS:
         buff.close()
         return image_stream
 
-    rgb_image = image.convert("RGB")
+    if image.mode not in ("1", "L", "LA", "RGB", "RGBA"):
+        image = image.convert(
+            "RGBA" if "A" in image.mode or "transparency" in image.info else "RGB"
+        )
     with BytesIO() as _file:
-        rgb_image.save(_file, format="JPEG")
+        image.save(_file, format="PNG")
         _file.seek(0)
         result = _file.read()
 
     buff.close()
     return result
+
+
+class PreparedImage:
+    """A class to represent an image converted and rotated ready to be drawn."""
+
+    __slots__ = ("stream",)
+
+    def __init__(self, stream: bytes) -> None:
+        """Keeps the prepared image stream shared by every draw."""
+
+        self.stream = stream
+
+    @property
+    def reader(self) -> ImageReader:
+        """A new reader of the image, as a reader is not safe to share across threads."""
+
+        return ImageReader(BytesIO(self.stream))
+
+    @property
+    def size(self) -> int:
+        """Number of bytes held."""
+
+        return len(self.stream)
+
+
+def prepare_image(image_stream: bytes, rotation: Union[float, int]) -> PreparedImage:
+    """Returns an image ready to be drawn, preparing each image and rotation once."""
+
+    key = (get_digest(image_stream), rotation)
+    result = IMAGE_CACHE.get(key)
+
+    if result is None:
+        result = any_image_to_png_or_jpg(image_stream)
+        if rotation:
+            result = rotate_image(result, rotation)
+        result = PreparedImage(result)
+        IMAGE_CACHE.put(key, result, result.size)
+
+    return result
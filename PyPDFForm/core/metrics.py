@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Contains helpers for measuring text using cached glyph widths."""
+
+from typing import Dict, List, Union
+
+from reportlab.lib.rl_accel import unicode2T1
+from reportlab.pdfbase.pdfmetrics import getFont
+from reportlab.pdfbase.ttfonts import TTFont
+
+from .font import load_font
+
+GLYPH_WIDTHS = {}
+
+
+class GlyphWidths:
+    """A class to represent the cached advance widths of a font's glyphs."""
+
+    __slots__ = ("font", "is_ttf", "widths")
+
+    def __init__(self, font) -> None:
+        """Constructs an empty cache for a reportlab font."""
+
+        self.font = font
+        self.is_ttf = isinstance(font, TTFont)
+        self.widths: Dict[str, Union[float, int]] = {}
+
+    def char_units(self, char: str) -> Union[float, int]:
+        """Returns the width of a character in glyph space units."""
+
+        result = self.widths.get(char)
+        if result is None:
+            if self.is_ttf:
+                result = self.font.face.charWidths.get(
+                    ord(char), self.font.face.defaultWidth
+                )
+            elif hasattr(self.font, "widths"):
+                result = sum(
+                    sum(map(font.widths.__getitem__, text))
+                    for font, text in unicode2T1(
+                        char, [self.font] + self.font.substitutionFonts
+                    )
+                )
+            else:
+                result = self.font.stringWidth(char, 1000)
+            self.widths[char] = result
+
+        return result
+
+    def to_width(self, units: Union[float, int], font_size: Union[float, int]) -> float:
+        """Converts glyph space units to a width, rounding the same way reportlab does."""
+
+        if self.is_ttf:
+            return 0.001 * font_size * units
+
+        return units * 0.001 * font_size
+
+
+def get_glyph_widths(font_name: str) -> GlyphWidths:
+    """Returns the glyph width cache of a font, rebuilt if the font is re-registered."""
+
+    load_font(font_name)
+    font = getFont(font_name)
+    result = GLYPH_WIDTHS.get(font_name)
+
+    if result is None or result.font is not font:
+        result = GlyphWidths(font)
+        GLYPH_WIDTHS[font_name] = result
+
+    return result
+
+
+def text_width(text: str, font_name: str, font_size: Union[float, int]) -> float:
+    """Returns the width of a text, same as reportlab's stringWidth."""
+
+    glyphs = get_glyph_widths(font_name)
+
+    return glyphs.to_width(sum(map(glyphs.char_units, text)), font_size)
+
+
+class TextWidths:
+    """A class to represent prefix sums of a text's glyph widths."""
+
+    __slots__ = ("glyphs", "font_size", "prefix")
+
+    def __init__(self, text: str, font_name: str, font_size: Union[float, int]) -> None:
+        """Accumulates the glyph widths of the text once."""
+
+        self.glyphs = get_glyph_widths(font_name)
+        self.font_size = font_size
+        self.prefix: List[Union[float, int]] = [0]
+
+        total = 0
+        for char in text:
+            total += self.glyphs.char_units(char)
+            self.prefix.append(total)
+
+    def __len__(self) -> int:
+        """Length of the measured text."""
+
+        return len(self.prefix) - 1
+
+    def width(self, start: int = 0, end: Union[int, None] = None) -> float:
+        """Returns the width of the substring from start to end."""
+
+        end = len(self) if end is None else min(end, len(self))
+
+        return self.glyphs.to_width(
+            self.prefix[end] - self.prefix[start], self.font_size
+        )
+
+    def fitting_length(self, max_width: float, start: int = 0) -> int:
+        """
+        Returns the length of the longest substring from start which
+        is not wider than max_width using binary search.
+        """
+
+        low = start
+        high = len(self)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.width(start, mid) <= max_width:
+                low = mid
+            else:
+                high = mid - 1
+
+        return low - start
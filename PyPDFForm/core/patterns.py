@@ -13,6 +13,7 @@ from .constants import (ANNOTATION_FIELD_KEY, BUTTON_IDENTIFIER,
                         TEXT_FIELD_APPEARANCE_IDENTIFIER,
                         TEXT_FIELD_IDENTIFIER, WIDGET_SUBTYPE_KEY,
                         WIDGET_TYPE_KEY)
+from .utils import compile_pattern, compile_patterns
 
 WIDGET_TYPE_PATTERNS = [
     (
@@ -76,3 +77,14 @@ TEXT_FIELD_APPEARANCE_PATTERNS = [
 BUTTON_STYLE_PATTERNS = [
     {BUTTON_IDENTIFIER: {BUTTON_STYLE_IDENTIFIER: True}},
 ]
+
+WIDGET_TYPE_LOOKUP = [
+    (tuple(compile_pattern(pattern) for pattern in patterns), _type)
+    for patterns, _type in WIDGET_TYPE_PATTERNS
+]
+WIDGET_KEY_LOOKUP = compile_patterns(WIDGET_KEY_PATTERNS)
+DROPDOWN_CHOICE_LOOKUP = compile_patterns(DROPDOWN_CHOICE_PATTERNS)
+WIDGET_ALIGNMENT_LOOKUP = compile_patterns(WIDGET_ALIGNMENT_PATTERNS)
+TEXT_FIELD_FLAG_LOOKUP = compile_patterns(TEXT_FIELD_FLAG_PATTERNS)
+TEXT_FIELD_APPEARANCE_LOOKUP = compile_patterns(TEXT_FIELD_APPEARANCE_PATTERNS)
+BUTTON_STYLE_LOOKUP = compile_patterns(BUTTON_STYLE_PATTERNS)
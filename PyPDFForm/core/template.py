@@ -1,19 +1,47 @@
 # -*- coding: utf-8 -*-
 """Contains helpers for template."""
 
-from typing import Dict, List, Tuple, Union
+import re
+from functools import wraps
+from typing import Callable, Dict, List, Tuple, Union
 
 from pypdf import PdfReader
-from reportlab.pdfbase.pdfmetrics import stringWidth
 
-from ..middleware.constants import WIDGET_TYPES
+from ..middleware.checkbox import Checkbox
+from ..middleware.dropdown import Dropdown
+from ..middleware.radio import Radio
 from ..middleware.text import Text
-from .constants import (ANNOTATION_RECTANGLE_KEY, COMB, MULTILINE,
-                        NEW_LINE_SYMBOL, TEXT_FIELD_MAX_LENGTH_KEY)
-from .patterns import (BUTTON_STYLE_PATTERNS, DROPDOWN_CHOICE_PATTERNS,
-                       TEXT_FIELD_FLAG_PATTERNS, WIDGET_ALIGNMENT_PATTERNS,
-                       WIDGET_KEY_PATTERNS, WIDGET_TYPE_PATTERNS)
-from .utils import find_pattern_match, stream_to_io, traverse_pattern
+from .cache import LRUCache
+from .constants import (ANNOTATION_RECTANGLE_KEY, AUTO_FONT_SIZE_STEP, COMB,
+                        DEFAULT_FONT_COLOR, DEFAULT_MIN_FONT_SIZE,
+                        LAYOUT_CACHE_MAX_COUNT, LEADING_RATIO, MULTILINE,
+                        NEW_LINE_SYMBOL, TEMPLATE_CACHE_MAX_COUNT,
+                        TEMPLATE_CACHE_MAX_SIZE, TEXT_FIELD_MAX_LENGTH_KEY)
+from .descriptor import WidgetDescriptor
+from .font import auto_detect_font, get_text_appearance, text_field_font_size
+from .metrics import TextWidths, get_glyph_widths
+from .patterns import (BUTTON_STYLE_LOOKUP, DROPDOWN_CHOICE_LOOKUP,
+                       TEXT_FIELD_FLAG_LOOKUP, WIDGET_ALIGNMENT_LOOKUP,
+                       WIDGET_KEY_LOOKUP, WIDGET_TYPE_LOOKUP)
+from .utils import (get_digest, match_compiled_pattern, stream_to_io,
+                    traverse_compiled_pattern)
+
+TEMPLATE_CACHE = LRUCache(TEMPLATE_CACHE_MAX_COUNT, TEMPLATE_CACHE_MAX_SIZE)
+LAYOUT_CACHE = LRUCache(LAYOUT_CACHE_MAX_COUNT)
+WORD_PATTERN = re.compile(r"[^ ]+")
+
+
+def get_widget_type(widget: dict) -> Union[type, None]:
+    """Finds the middleware class of a PDF widget by pattern matching."""
+
+    for each in WIDGET_TYPE_LOOKUP:
+        patterns, _type = each
+        check = True
+        for pattern in patterns:
+            check = check and match_compiled_pattern(pattern, widget)
+        if check:
+            return _type
+    return None
 
 
 def get_widgets_by_page(pdf: bytes) -> Dict[int, List[dict]]:
@@ -29,14 +57,8 @@ def get_widgets_by_page(pdf: bytes) -> Dict[int, List[dict]]:
         if widgets:
             for widget in widgets:
                 widget = dict(widget.get_object())
-                for each in WIDGET_TYPE_PATTERNS:
-                    patterns = each[0]
-                    check = True
-                    for pattern in patterns:
-                        check = check and find_pattern_match(pattern, widget)
-                    if check:
-                        result[i + 1].append(widget)
-                        break
+                if get_widget_type(widget) is not None:
+                    result[i + 1].append(widget)
 
     return result
 
@@ -44,40 +66,13 @@ def get_widgets_by_page(pdf: bytes) -> Dict[int, List[dict]]:
 def get_widget_key(widget: dict) -> Union[str, None]:
     """Finds a PDF widget's annotated key by pattern matching."""
 
-    result = None
-    for pattern in WIDGET_KEY_PATTERNS:
-        value = traverse_pattern(pattern, widget)
-        if value:
-            result = value
-            break
-    return result
+    return traverse_compiled_pattern(WIDGET_KEY_LOOKUP, widget)
 
 
 def get_widget_alignment(widget: dict) -> Union[str, None]:
     """Finds a PDF widget's alignment by pattern matching."""
 
-    result = None
-    for pattern in WIDGET_ALIGNMENT_PATTERNS:
-        value = traverse_pattern(pattern, widget)
-        if value:
-            result = value
-            break
-    return result
-
-
-def construct_widget(widget: dict, key: str) -> Union[WIDGET_TYPES, None]:
-    """Finds a PDF widget's annotated type by pattern matching."""
-
-    result = None
-    for each in WIDGET_TYPE_PATTERNS:
-        patterns, _type = each
-        check = True
-        for pattern in patterns:
-            check = check and find_pattern_match(pattern, widget)
-        if check:
-            result = _type(key)
-            break
-    return result
+    return traverse_compiled_pattern(WIDGET_ALIGNMENT_LOOKUP, widget)
 
 
 def get_text_field_max_length(widget: dict) -> Union[int, None]:
@@ -90,75 +85,173 @@ def get_text_field_max_length(widget: dict) -> Union[int, None]:
     )
 
 
-def check_field_flag_bit(widget: dict, bit: int) -> bool:
-    """Checks if a bit is set in a widget's field flag."""
+def get_field_flag(widget: dict) -> Union[int, None]:
+    """Returns a widget's field flag if presented or None."""
 
-    field_flag = None
-    for pattern in TEXT_FIELD_FLAG_PATTERNS:
-        field_flag = traverse_pattern(pattern, widget)
-        if field_flag is not None:
-            break
+    field_flag = traverse_compiled_pattern(TEXT_FIELD_FLAG_LOOKUP, widget)
 
-    if field_flag is None:
-        return False
+    return int(field_flag) if field_flag is not None else None
 
-    return bool(int(field_flag) & bit)
 
+def get_dropdown_choices(widget: dict) -> Union[Tuple[str], None]:
+    """Returns string options of a dropdown field."""
 
-def is_text_field_comb(widget: dict) -> bool:
-    """Returns true if characters in a text field needs to be formatted into combs."""
+    choices = traverse_compiled_pattern(DROPDOWN_CHOICE_LOOKUP, widget)
+    if not choices:
+        return None
 
-    return check_field_flag_bit(widget, COMB)
+    return tuple((each if isinstance(each, str) else str(each[1])) for each in choices)
 
 
-def is_text_multiline(widget: dict) -> bool:
-    """Returns true if a text field is a paragraph field."""
+def get_button_style(widget: dict) -> Union[str, None]:
+    """Returns the button style of a checkbox or radiobutton."""
 
-    return check_field_flag_bit(widget, MULTILINE)
+    style = traverse_compiled_pattern(BUTTON_STYLE_LOOKUP, widget)
 
+    return str(style) if style is not None else None
 
-def get_dropdown_choices(widget: dict) -> Union[Tuple[str], None]:
-    """Returns string options of a dropdown field."""
 
-    result = None
-    for pattern in DROPDOWN_CHOICE_PATTERNS:
-        choices = traverse_pattern(pattern, widget)
-        if choices:
-            result = tuple(
-                (each if isinstance(each, str) else str(each[1])) for each in choices
-            )
-            break
+def describe_widget(page: int, widget: dict, widget_type: type) -> WidgetDescriptor:
+    """Extracts every property of a PDF widget needed downstream in one pass."""
+
+    result = WidgetDescriptor(
+        get_widget_key(widget),
+        widget_type,
+        page,
+        tuple(float(each) for each in widget[ANNOTATION_RECTANGLE_KEY]),
+    )
+
+    field_flag = get_field_flag(widget) or 0
+    result.multiline = bool(field_flag & MULTILINE)
+    result.comb = bool(field_flag & COMB)
+    result.alignment = int(get_widget_alignment(widget) or 0)
+
+    if widget_type in (Text, Dropdown):
+        result.max_length = get_text_field_max_length(widget)
+        text_appearance = get_text_appearance(widget)
+        result.font = auto_detect_font(text_appearance)
+        result.font_size = text_appearance.font_size or text_field_font_size(result)
+        result.font_color = text_appearance.font_color or DEFAULT_FONT_COLOR
+
+    if widget_type is Dropdown:
+        result.choices = get_dropdown_choices(widget)
+
+    if widget_type in (Checkbox, Radio):
+        result.button_style = get_button_style(widget)
 
     return result
 
 
-def get_button_style(widget: dict) -> Union[str, None]:
-    """Returns the button style of a checkbox or radiobutton."""
+class TemplateIndex:
+    """A class to represent a PDF form template parsed only once."""
 
-    for pattern in BUTTON_STYLE_PATTERNS:
-        style = traverse_pattern(pattern, widget)
-        if style is not None:
-            return str(style)
+    def __init__(self, pdf: bytes) -> None:
+        """Parses pages and widgets of the template stream."""
 
-    return None
+        self.stream = pdf
+        self.page_sizes = []
+        self.widgets = []
+        self.widgets_by_page = {}
+        self.fill_plan = None
 
+        for i, page in enumerate(PdfReader(stream_to_io(pdf)).pages):
+            self.page_sizes.append((float(page.mediabox[2]), float(page.mediabox[3])))
+            self.widgets_by_page[i + 1] = []
+            for widget in page.annotations or []:
+                widget = dict(widget.get_object())
+                widget_type = get_widget_type(widget)
+                if widget_type is not None:
+                    descriptor = describe_widget(i + 1, widget, widget_type)
+                    self.widgets.append(descriptor)
+                    self.widgets_by_page[i + 1].append(descriptor)
 
-def get_char_rect_width(widget: dict, widget_middleware: Text) -> float:
-    """Returns rectangular width of each character for combed text fields."""
+    @property
+    def page_count(self) -> int:
+        """Number of pages of the template."""
+
+        return len(self.page_sizes)
 
-    rect_width = abs(
-        float(widget[ANNOTATION_RECTANGLE_KEY][0])
-        - float(widget[ANNOTATION_RECTANGLE_KEY][2])
+
+def get_template_index(pdf: bytes) -> TemplateIndex:
+    """Returns the parsed template of a stream, shared by identical streams."""
+
+    key = get_digest(pdf)
+    result = TEMPLATE_CACHE.get(key)
+
+    if result is None:
+        result = TemplateIndex(pdf)
+        TEMPLATE_CACHE.put(key, result, len(pdf))
+
+    return result
+
+
+def count_template_size(template: TemplateIndex, derived_size: int) -> None:
+    """Counts bytes derived from a cached template in its cache entry size."""
+
+    TEMPLATE_CACHE.resize(
+        get_digest(template.stream), len(template.stream) + derived_size
     )
-    return rect_width / widget_middleware.max_length
 
 
-def get_character_x_paddings(widget: dict, widget_middleware: Text) -> List[float]:
+def get_layout_key(widget: WidgetDescriptor, widget_middleware: Text) -> tuple:
+    """Returns everything the layout of a text field's value depends on."""
+
+    return (
+        widget_middleware.value,
+        widget_middleware.font,
+        widget_middleware.font_size,
+        widget.rect,
+        widget.alignment,
+        widget.multiline,
+        widget_middleware.comb,
+        widget_middleware.max_length,
+        widget_middleware.preview,
+        (
+            tuple(widget_middleware.text_lines)
+            if widget_middleware.text_lines is not None
+            else None
+        ),
+    )
+
+
+def memoize_layout(func: Callable) -> Callable:
+    """
+    Memoizes a layout helper returning a list or None in the layout
+    cache. Each call gets its own copy of the cached list.
+    """
+
+    @wraps(func)
+    def wrapper(widget: WidgetDescriptor, widget_middleware: Text):
+        key = (func.__name__,) + get_layout_key(widget, widget_middleware)
+        cached = LAYOUT_CACHE.get(key)
+
+        if cached is None:
+            result = func(widget, widget_middleware)
+            cached = (tuple(result) if result is not None else None,)
+            LAYOUT_CACHE.put(key, cached)
+
+        return list(cached[0]) if cached[0] is not None else None
+
+    return wrapper
+
+
+def get_char_rect_width(widget: WidgetDescriptor, widget_middleware: Text) -> float:
+    """Returns rectangular width of each character for combed text fields."""
+
+    return widget.width / widget_middleware.max_length
+
+
+@memoize_layout
+def get_character_x_paddings(
+    widget: WidgetDescriptor, widget_middleware: Text
+) -> List[float]:
     """Returns paddings between characters for combed text fields."""
 
     length = min(len(widget_middleware.value or ""), widget_middleware.max_length)
     char_rect_width = get_char_rect_width(widget, widget_middleware)
 
+    glyphs = get_glyph_widths(widget_middleware.font)
+
     result = []
 
     current_x = 0
@@ -166,127 +259,133 @@ def get_character_x_paddings(widget: dict, widget_middleware: Text) -> List[floa
         current_mid_point = current_x + char_rect_width / 2
         result.append(
             current_mid_point
-            - stringWidth(char, widget_middleware.font, widget_middleware.font_size) / 2
+            - glyphs.to_width(glyphs.char_units(char), widget_middleware.font_size) / 2
         )
         current_x += char_rect_width
 
     return result
 
 
-def calculate_wrap_length(widget: dict, widget_middleware: Text, v: str) -> int:
-    """Increments the substring until reaching maximum horizontal width."""
+def wrap_text(text: str, widths: TextWidths, width: float) -> List[str]:
+    """
+    Greedily breaks a text without line breaks into lines that fit within
+    width, measuring each word once. Words wider than a line are split.
+    """
 
-    width = abs(
-        float(widget[ANNOTATION_RECTANGLE_KEY][0])
-        - float(widget[ANNOTATION_RECTANGLE_KEY][2])
-    )
-    value = widget_middleware.value or ""
-    value = value.replace(NEW_LINE_SYMBOL, " ")
-
-    counter = 0
-    _width = 0
-    while _width <= width and counter < len(value):
-        counter += 1
-        _width = stringWidth(
-            v[:counter],
-            widget_middleware.font,
-            widget_middleware.font_size,
-        )
-    return counter - 1
+    result = []
+    line_start = 0
+    line_end = None
+
+    for word in WORD_PATTERN.finditer(text):
+        word_start, word_end = word.span()
+        if widths.width(line_start, word_end) <= width:
+            line_end = word_end
+            continue
+
+        if line_end is not None:
+            result.append(text[line_start:line_end])
+        line_start = word_start
+        line_end = word_end
+
+        while widths.width(word_start, word_end) > width:
+            fitting = max(widths.fitting_length(width, word_start), 1)
+            result.append(text[word_start : word_start + fitting])
+            word_start += fitting
+            line_start = word_start
+
+    if line_end is None:
+        result.append("")
+    elif line_start < line_end:
+        result.append(text[line_start:line_end])
+
+    return result
 
 
-def get_paragraph_lines(widget: dict, widget_middleware: Text) -> List[str]:
-    """Splits the paragraph field's text to a list of lines."""
+@memoize_layout
+def get_paragraph_lines(widget: WidgetDescriptor, widget_middleware: Text) -> List[str]:
+    """Splits the paragraph field's text to a list of lines fitting its width."""
 
-    # pylint: disable=R0912
-    lines = []
-    result = []
-    text_wrap_length = widget_middleware.text_wrap_length
     value = widget_middleware.value or ""
     if widget_middleware.max_length is not None:
         value = value[: widget_middleware.max_length]
 
-    width = abs(
-        float(widget[ANNOTATION_RECTANGLE_KEY][0])
-        - float(widget[ANNOTATION_RECTANGLE_KEY][2])
-    )
+    if not value:
+        return []
 
-    split_by_new_line_symbol = value.split(NEW_LINE_SYMBOL)
-    for line in split_by_new_line_symbol:
-        characters = line.split(" ")
-        current_line = ""
-        for each in characters:
-            line_extended = f"{current_line} {each}" if current_line else each
-            if len(line_extended) <= text_wrap_length:
-                current_line = line_extended
-            else:
-                lines.append(current_line)
-                current_line = each
-        lines.append(
-            current_line + NEW_LINE_SYMBOL
-            if len(split_by_new_line_symbol) > 1
-            else current_line
+    result = []
+    for line in value.split(NEW_LINE_SYMBOL):
+        result += wrap_text(
+            line,
+            TextWidths(line, widget_middleware.font, widget_middleware.font_size),
+            widget.width,
         )
 
-    for line in lines:
-        while (
-            stringWidth(
-                line[:text_wrap_length],
-                widget_middleware.font,
-                widget_middleware.font_size,
-            )
-            > width
-        ):
-            text_wrap_length -= 1
-
-    for each in lines:
-        while len(each) > text_wrap_length:
-            result.append(each[:text_wrap_length])
-            each = each[text_wrap_length:]
-        if each:
-            if (
-                result
-                and len(each) + 1 + len(result[-1]) <= text_wrap_length
-                and NEW_LINE_SYMBOL not in result[-1]
-            ):
-                result[-1] = f"{result[-1]}{each} "
-            else:
-                result.append(f"{each} ")
-
-    for i, each in enumerate(result):
-        result[i] = each.replace(NEW_LINE_SYMBOL, "")
-
-    if result:
-        result[-1] = result[-1][:-1]
-
     return result
 
 
-def get_paragraph_auto_wrap_length(widget: dict, widget_middleware: Text) -> int:
-    """Calculates the text wrap length of a paragraph field."""
+def get_auto_font_size(
+    widget: WidgetDescriptor, widget_middleware: Text
+) -> Union[float, int]:
+    """
+    Returns the largest font size between the text field's min and max
+    font sizes its text fits in, bisecting over the cached glyph widths.
+    """
 
     value = widget_middleware.value or ""
-    value = value.replace(NEW_LINE_SYMBOL, " ")
-    width = abs(
-        float(widget[ANNOTATION_RECTANGLE_KEY][0])
-        - float(widget[ANNOTATION_RECTANGLE_KEY][2])
+    if widget_middleware.max_length is not None:
+        value = value[: widget_middleware.max_length]
+
+    low = (
+        widget_middleware.min_font_size
+        if widget_middleware.min_font_size is not None
+        else DEFAULT_MIN_FONT_SIZE
     )
-    text_width = stringWidth(
-        value,
-        widget_middleware.font,
-        widget_middleware.font_size,
+    high = (
+        widget_middleware.max_font_size
+        if widget_middleware.max_font_size is not None
+        else widget_middleware.font_size
     )
 
-    lines = text_width / width
-    if lines > 1:
-        current_min = 0
-        while len(value) and current_min < len(value):
-            result = calculate_wrap_length(widget, widget_middleware, value)
-            value = value[result:]
-            if current_min == 0:
-                current_min = result
-            elif result < current_min:
-                current_min = result
-        return current_min
-
-    return len(value) + 1
+    if not value or high <= low:
+        return high
+
+    lines = value.split(NEW_LINE_SYMBOL) if widget.multiline else [value]
+    widths = [TextWidths(line, widget_middleware.font, high) for line in lines]
+
+    def fits(font_size: Union[float, int]) -> bool:
+        """Checks if the text fits the widget at a font size."""
+
+        for each in widths:
+            each.font_size = font_size
+
+        if widget.multiline:
+            count = 0
+            for line, each in zip(lines, widths):
+                count += len(wrap_text(line, each, widget.width))
+
+            return count * font_size * LEADING_RATIO <= widget.height
+
+        if font_size > widget.height:
+            return False
+
+        if widget_middleware.comb is True:
+            glyphs = widths[0].glyphs
+            return glyphs.to_width(
+                max(map(glyphs.char_units, value)), font_size
+            ) <= get_char_rect_width(widget, widget_middleware)
+
+        return widths[0].width() <= widget.width
+
+    if fits(high):
+        return high
+    if not fits(low):
+        return low
+
+    while high - low > AUTO_FONT_SIZE_STEP:
+        mid = (low + high) / 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid
+
+    return low
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 """Contains utility helpers."""
 
+from hashlib import sha256
 from io import BytesIO
-from typing import BinaryIO, List, Union
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple, Union
 
-from pypdf import PdfReader, PdfWriter
-from pypdf.generic import DictionaryObject
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import (DictionaryObject, IndirectObject, NameObject,
+                           StreamObject)
 
 from ..middleware.checkbox import Checkbox
 from ..middleware.constants import WIDGET_TYPES
@@ -26,6 +29,12 @@ def stream_to_io(stream: bytes) -> BinaryIO:
     return result
 
 
+def get_digest(stream: bytes) -> str:
+    """Returns a digest identifying the content of a byte stream."""
+
+    return sha256(stream).hexdigest()
+
+
 def checkbox_radio_to_draw(
     widget: Union[Checkbox, Radio], font_size: Union[float, int]
 ) -> Text:
@@ -60,22 +69,6 @@ def preview_widget_to_draw(widget: WIDGET_TYPES) -> Text:
     return new_widget
 
 
-def remove_all_widgets(pdf: bytes) -> bytes:
-    """Removes all widgets from a PDF form."""
-
-    pdf = PdfReader(stream_to_io(pdf))
-    result_stream = BytesIO()
-    writer = PdfWriter()
-    for page in pdf.pages:
-        if page.annotations:
-            page.annotations.clear()
-        writer.add_page(page)
-
-    writer.write(result_stream)
-    result_stream.seek(0)
-    return result_stream.read()
-
-
 def get_page_streams(pdf: bytes) -> List[bytes]:
     """Returns a list of streams where each is a page of the input PDF."""
 
@@ -93,58 +86,161 @@ def get_page_streams(pdf: bytes) -> List[bytes]:
     return result
 
 
+def get_image_key(image: StreamObject) -> Union[tuple, None]:
+    """Returns what identifies the content of an image XObject if it can be compared."""
+
+    entries = []
+    for key, value in sorted(image.items()):
+        if key in ("/Length", "/SMask"):
+            continue
+        if isinstance(value, IndirectObject):
+            return None
+        entries.append((key, str(value)))
+
+    smask_key = None
+    if "/SMask" in image:
+        smask_key = get_image_key(image["/SMask"].get_object())
+        if smask_key is None:
+            return None
+
+    return get_digest(image.get_data()), tuple(entries), smask_key
+
+
+def share_identical_images(
+    page: PageObject, writer: PdfWriter, images: Dict[tuple, IndirectObject]
+) -> None:
+    """
+    Copies the image XObjects of a page to a PDF writer ahead of the page,
+    pointing them at the copies of identical images seen before.
+    """
+
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return
+
+    xobjects = xobjects.get_object()
+    for name, ref in list(xobjects.items()):
+        if not isinstance(ref, IndirectObject):
+            continue
+
+        image = ref.get_object()
+        if image.get("/Subtype") != "/Image":
+            continue
+
+        key = get_image_key(image)
+        if key is None:
+            continue
+
+        if key not in images:
+            images[key] = ref.clone(writer)
+        xobjects[NameObject(name)] = images[key]
+
+
+def merge_pdfs(pdfs: Iterable[bytes], output: BinaryIO) -> None:
+    """
+    Merges PDFs into one PDF, opening each only once, and writes it to output.
+    Identical images across the PDFs are written only once, and each PDF
+    is released as soon as its pages are copied.
+    """
+
+    writer = PdfWriter()
+    images = {}
+
+    for pdf in pdfs:
+        reader = PdfReader(stream_to_io(pdf))
+        for page in reader.pages:
+            share_identical_images(page, writer, images)
+            writer.add_page(page)
+        writer.reset_translation(reader)
+
+    writer.write(output)
+
+
 def merge_two_pdfs(pdf: bytes, other: bytes) -> bytes:
     """Merges two PDFs into one PDF."""
 
-    output = PdfWriter()
-    pdf = PdfReader(stream_to_io(pdf))
-    other = PdfReader(stream_to_io(other))
     result = BytesIO()
-
-    for page in pdf.pages:
-        output.add_page(page)
-    for page in other.pages:
-        output.add_page(page)
-
-    output.write(result)
+    merge_pdfs((pdf, other), result)
     result.seek(0)
     return result.read()
 
 
-def find_pattern_match(pattern: dict, widget: Union[dict, DictionaryObject]) -> bool:
-    """Checks if a PDF dict pattern exists in a PDF widget."""
-
-    for key, value in widget.items():
-        result = False
-        if key in pattern:
-            value = value.get_object()
-            if isinstance(pattern[key], dict) and isinstance(
-                value, (dict, DictionaryObject)
-            ):
-                result = find_pattern_match(pattern[key], value)
-            else:
-                result = pattern[key] == value
-        if result:
-            return result
+def compile_pattern(pattern: dict) -> Tuple[Tuple[Tuple[str, ...], Any], ...]:
+    """Flattens a PDF dict pattern into the key paths it looks up."""
+
+    result = []
+    for key, value in pattern.items():
+        if isinstance(value, dict):
+            result.extend(((key, *path), leaf) for path, leaf in compile_pattern(value))
+        else:
+            result.append(((key,), value))
+
+    return tuple(result)
+
+
+def compile_patterns(patterns: List[dict]) -> Tuple[Tuple[Tuple[str, ...], Any], ...]:
+    """Flattens a list of PDF dict patterns into key paths in order."""
+
+    return tuple(each for pattern in patterns for each in compile_pattern(pattern))
+
+
+def lookup_path(path: Tuple[str, ...], widget: Union[dict, DictionaryObject]) -> Any:
+    """
+    Follows a key path down a PDF widget. Resolved objects are cached
+    back into plain dict copies so that parents are only resolved once.
+    """
+
+    value = widget
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+
+        unresolved = value[key]
+        resolved = unresolved.get_object()
+        if (
+            resolved is not unresolved
+            and isinstance(value, dict)
+            and not isinstance(value, DictionaryObject)
+        ):
+            value[key] = resolved
+        value = resolved
+
+    return value
+
+
+def match_compiled_pattern(
+    compiled: Tuple[Tuple[Tuple[str, ...], Any], ...],
+    widget: Union[dict, DictionaryObject],
+) -> bool:
+    """Checks if any key path of a compiled pattern leads to its expected value."""
+
+    for path, expected in compiled:
+        if lookup_path(path, widget) == expected:
+            return True
     return False
 
 
-def traverse_pattern(
-    pattern: dict, widget: Union[dict, DictionaryObject]
+def traverse_compiled_pattern(
+    compiled: Tuple[Tuple[Tuple[str, ...], Any], ...],
+    widget: Union[dict, DictionaryObject],
 ) -> Union[str, list, None]:
-    """Traverses down a PDF dict pattern and find the value."""
-
-    for key, value in widget.items():
-        result = None
-        if key in pattern:
-            value = value.get_object()
-            if isinstance(pattern[key], dict) and isinstance(
-                value, (dict, DictionaryObject)
-            ):
-                result = traverse_pattern(pattern[key], value)
-            else:
-                if pattern[key] is True and value:
-                    return value
-        if result:
-            return result
+    """Returns the first presented value found following compiled key paths."""
+
+    for path, expected in compiled:
+        if expected is True:
+            value = lookup_path(path, widget)
+            if value:
+                return value
     return None
+
+
+def get_chunks(records: Iterable, chunk_size: int) -> Iterator[list]:
+    """Lazily splits records into lists of at most chunk_size records."""
+
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
@@ -2,13 +2,17 @@
 """Contains helpers for watermark."""
 
 from io import BytesIO
-from typing import List
+from typing import Dict, Iterable, List, Tuple, Union
 
-from pypdf import PdfReader, PdfWriter
-from reportlab.lib.utils import ImageReader
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.filters import ASCII85Decode
+from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject,
+                           NameObject)
 from reportlab.pdfgen.canvas import Canvas
 
-from .utils import stream_to_io
+from .constants import COPIED_PAGE_ATTRIBUTES, TEMPLATE_XOBJECT_NAME
+from .font import load_font
+from .utils import get_chunks, stream_to_io
 
 
 def draw_text(*args) -> None:
@@ -27,6 +31,7 @@ def draw_text(*args) -> None:
     if widget.max_length is not None:
         text_to_draw = text_to_draw[: widget.max_length]
 
+    load_font(widget.font)
     canvas.setFont(widget.font, widget.font_size)
     canvas.setFillColorRGB(
         widget.font_color[0], widget.font_color[1], widget.font_color[2]
@@ -106,58 +111,62 @@ def draw_image(*args) -> None:
     """Draws an image on the watermark."""
 
     canvas = args[0]
-    image_stream = args[1]
+    image = args[1]
     coordinate_x = args[2]
     coordinate_y = args[3]
     width = args[4]
     height = args[5]
 
-    image_buff = BytesIO()
-    image_buff.write(image_stream)
-    image_buff.seek(0)
-
     canvas.drawImage(
-        ImageReader(image_buff),
+        image.reader,
         coordinate_x,
         coordinate_y,
         width=width,
         height=height,
+        mask="auto",
     )
 
-    image_buff.close()
 
+def draw_widget(*args) -> None:
+    """Creates an acro form widget on the watermark."""
+
+    canvas = args[0]
+    acro_form_func = args[1]
+    acro_form_params = args[2]
+
+    getattr(canvas.acroForm, acro_form_func)(**acro_form_params)
 
-def create_watermarks_and_draw(
-    pdf: bytes,
-    page_number: int,
-    action_type: str,
-    actions: List[list],
-) -> List[bytes]:
-    """Creates a canvas watermark and draw some stuffs on it."""
 
-    pdf_file = PdfReader(stream_to_io(pdf))
+DRAW_ACTIONS = {
+    "image": draw_image,
+    "text": draw_text,
+    "line": draw_line,
+    "rect": draw_rect,
+    "widget": draw_widget,
+}
+
+
+def create_watermark(
+    page_sizes: List[Tuple[float, float]],
+    actions_by_page: Dict[int, List[Tuple[str, list]]],
+) -> bytes:
+    """
+    Draws the actions of all pages into one watermark document
+    which has a page for each page that has something to draw.
+    """
+
     buff = BytesIO()
+    canvas = Canvas(buff)
 
-    canvas = Canvas(
-        buff,
-        pagesize=(
-            float(pdf_file.pages[page_number - 1].mediabox[2]),
-            float(pdf_file.pages[page_number - 1].mediabox[3]),
-        ),
-    )
+    for page_number in sorted(actions_by_page):
+        actions = actions_by_page[page_number]
+        if not actions:
+            continue
 
-    if action_type == "image":
-        for each in actions:
-            draw_image(*([canvas, *each]))
-    elif action_type == "text":
-        for each in actions:
-            draw_text(*([canvas, *each]))
-    elif action_type == "line":
-        for each in actions:
-            draw_line(*([canvas, *each]))
-    elif action_type == "rect":
-        for each in actions:
-            draw_rect(*([canvas, *each]))
+        canvas.setPageSize(page_sizes[page_number - 1])
+        for action_type, action in actions:
+            DRAW_ACTIONS[action_type](*([canvas, *action]))
+        canvas.showPage()
 
     canvas.save()
     buff.seek(0)
@@ -165,31 +174,165 @@ def create_watermarks_and_draw(
     watermark = buff.read()
     buff.close()
 
-    results = []
+    return watermark
 
-    for i in range(len(pdf_file.pages)):
-        results.append(watermark if i == page_number - 1 else b"")
 
-    return results
+def remove_ascii85_from_images(page: PageObject) -> None:
+    """
+    Stores the images reportlab drew on a watermark page as binary, without
+    the ASCII85 encoding that makes them a quarter bigger.
+    """
 
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return
 
-def merge_watermarks_with_pdf(
+    images = [each.get_object() for each in xobjects.get_object().values()]
+    while images:
+        image = images.pop()
+        if image.get("/Subtype") != "/Image":
+            continue
+        if "/SMask" in image:
+            images.append(image["/SMask"].get_object())
+
+        filters = image.get("/Filter")
+        if not isinstance(filters, ArrayObject) or filters[0] != "/ASCII85Decode":
+            continue
+
+        image._data = ASCII85Decode.decode(image._data)  # pylint: disable=W0212
+        image[NameObject("/Filter")] = (
+            filters[1] if len(filters) == 2 else ArrayObject(filters[1:])
+        )
+
+
+def merge_watermark_with_pdf(
     pdf: bytes,
-    watermarks: list,
+    actions_by_page: Dict[int, List[Tuple[str, list]]],
+    page_sizes: Union[List[Tuple[float, float]], None] = None,
+    remove_widgets: bool = False,
 ) -> bytes:
-    """Merges watermarks with PDF."""
+    """
+    Draws actions of all pages onto a PDF and optionally removes
+    all its widgets, writing the result only once.
+    """
 
     result = BytesIO()
     pdf = PdfReader(stream_to_io(pdf))
     output = PdfWriter()
 
+    if page_sizes is None:
+        page_sizes = [
+            (float(page.mediabox[2]), float(page.mediabox[3])) for page in pdf.pages
+        ]
+
+    pages_to_draw = {
+        page: i
+        for i, page in enumerate(
+            each for each in sorted(actions_by_page) if actions_by_page[each]
+        )
+    }
+    watermark = (
+        PdfReader(stream_to_io(create_watermark(page_sizes, actions_by_page)))
+        if pages_to_draw
+        else None
+    )
+
     for i, page in enumerate(pdf.pages):
-        if watermarks[i]:
-            watermark = PdfReader(stream_to_io(watermarks[i]))
-            if watermark.pages:
-                page.merge_page(watermark.pages[0])
+        if remove_widgets and page.annotations:
+            page.annotations.clear()
+        if i + 1 in pages_to_draw:
+            watermark_page = watermark.pages[pages_to_draw[i + 1]]
+            remove_ascii85_from_images(watermark_page)
+            page.merge_page(watermark_page)
         output.add_page(page)
 
     output.write(result)
     result.seek(0)
     return result.read()
+
+
+def page_to_form_xobject(output: PdfWriter, page) -> DictionaryObject:
+    """Adds the content of a page to a PDF writer as a reusable form XObject."""
+
+    content = page.get_contents()
+    xobject = DecodedStreamObject()
+    xobject.set_data(content.get_data() if content is not None else b"")
+    xobject.update(
+        {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): page.mediabox.clone(output),
+            NameObject("/Resources"): page.get("/Resources", DictionaryObject()).clone(
+                output
+            ),
+        }
+    )
+
+    return output._add_object(xobject.flate_encode())  # pylint: disable=W0212
+
+
+def merge_watermarks_with_pdf_copies(
+    pdf: bytes,
+    actions_by_copy: Iterable[Dict[int, List[Tuple[str, list]]]],
+    page_sizes: List[Tuple[float, float]],
+    chunk_size: int,
+) -> bytes:
+    """
+    Writes one copy of a PDF for each set of actions into a single PDF.
+    The content of the PDF is shared by all copies as form XObjects and
+    the actions of each chunk of copies are drawn into one watermark.
+    """
+
+    result = BytesIO()
+    pdf = PdfReader(stream_to_io(pdf))
+    output = PdfWriter()
+
+    templates = [page_to_form_xobject(output, page) for page in pdf.pages]
+    template_draw = output._add_object(DecodedStreamObject())  # pylint: disable=W0212
+    template_draw.get_object().set_data(f"q {TEMPLATE_XOBJECT_NAME} Do Q\n".encode())
+    page_count = len(pdf.pages)
+
+    for chunk in get_chunks(actions_by_copy, chunk_size):
+        actions_by_page = {
+            i * page_count + page: actions
+            for i, each in enumerate(chunk)
+            for page, actions in each.items()
+            if actions
+        }
+        pages_to_draw = {page: i for i, page in enumerate(sorted(actions_by_page))}
+        watermark = (
+            PdfReader(
+                stream_to_io(create_watermark(page_sizes * len(chunk), actions_by_page))
+            )
+            if pages_to_draw
+            else None
+        )
+
+        for i in range(len(chunk) * page_count):
+            template_page = pdf.pages[i % page_count]
+            if i + 1 in pages_to_draw:
+                page = output.add_page(watermark.pages[pages_to_draw[i + 1]])
+            else:
+                page = output.add_blank_page(*page_sizes[i % page_count])
+
+            contents = page.get(NameObject("/Contents"), ArrayObject())
+            if not isinstance(contents, ArrayObject):
+                contents = ArrayObject([page.raw_get("/Contents")])
+
+            resources = DictionaryObject(page.get("/Resources", DictionaryObject()))
+            xobjects = DictionaryObject(resources.get("/XObject", DictionaryObject()))
+            xobjects[NameObject(TEMPLATE_XOBJECT_NAME)] = templates[i % page_count]
+            resources[NameObject("/XObject")] = xobjects
+
+            page[NameObject("/Resources")] = resources
+            page[NameObject("/Contents")] = ArrayObject([template_draw, *contents])
+            for key in COPIED_PAGE_ATTRIBUTES:
+                if key in template_page:
+                    page[NameObject(key)] = template_page[key].clone(output)
+                elif key in page:
+                    del page[key]
+
+    output.write(result)
+    result.seek(0)
+    return result.read()
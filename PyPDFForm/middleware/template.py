@@ -1,18 +1,11 @@
 # -*- coding: utf-8 -*-
 """Contains helpers for template middleware."""
 
-from typing import Dict, List
-
-from ..core.constants import ANNOTATION_RECTANGLE_KEY
-from ..core.font import (auto_detect_font, get_text_field_font_color,
-                         get_text_field_font_size, text_field_font_size)
-from ..core.template import (construct_widget, get_button_style,
-                             get_character_x_paddings, get_dropdown_choices,
-                             get_paragraph_auto_wrap_length,
-                             get_paragraph_lines, get_text_field_max_length,
-                             get_widget_key, get_widgets_by_page,
-                             is_text_field_comb, is_text_multiline)
-from ..core.watermark import create_watermarks_and_draw
+from typing import Dict, List, Tuple, Union
+
+from ..core.font import FontScope
+from ..core.template import (TemplateIndex, get_auto_font_size,
+                             get_character_x_paddings, get_paragraph_lines)
 from .checkbox import Checkbox
 from .constants import WIDGET_TYPES
 from .dropdown import Dropdown
@@ -21,76 +14,62 @@ from .text import Text
 
 
 def set_character_x_paddings(
-    pdf_stream: bytes, widgets: Dict[str, WIDGET_TYPES]
+    template: TemplateIndex, widgets: Dict[str, WIDGET_TYPES]
 ) -> Dict[str, WIDGET_TYPES]:
     """Sets paddings between characters for combed text fields."""
 
-    for _widgets in get_widgets_by_page(pdf_stream).values():
-        for widget in _widgets:
-            key = get_widget_key(widget)
-            _widget = widgets[key]
+    for each in template.widgets:
+        _widget = widgets[each.key]
 
-            if isinstance(_widget, Text) and _widget.comb is True:
-                _widget.character_paddings = get_character_x_paddings(widget, _widget)
+        if isinstance(_widget, Text) and _widget.comb is True:
+            _widget.character_paddings = get_character_x_paddings(each, _widget)
 
     return widgets
 
 
-def build_widgets(pdf_stream: bytes) -> Dict[str, WIDGET_TYPES]:
-    """Builds a widget dict given a PDF form stream."""
+def build_widgets(template: TemplateIndex) -> Dict[str, WIDGET_TYPES]:
+    """Builds a widget dict given a parsed PDF form template."""
 
     results = {}
 
-    for widgets in get_widgets_by_page(pdf_stream).values():
-        for widget in widgets:
-            key = get_widget_key(widget)
-
-            _widget = construct_widget(widget, key)
+    for each in template.widgets:
+        key = each.key
 
-            if _widget is not None:
-                if isinstance(_widget, Text):
-                    _widget.max_length = get_text_field_max_length(widget)
-                    if _widget.max_length is not None and is_text_field_comb(widget):
-                        _widget.comb = True
+        _widget = each.type(key)
 
-                if isinstance(_widget, (Checkbox, Radio)):
-                    _widget.button_style = get_button_style(widget)
+        if isinstance(_widget, Text):
+            _widget.max_length = each.max_length
+            if _widget.max_length is not None and each.comb:
+                _widget.comb = True
 
-                if isinstance(_widget, Dropdown):
-                    _widget.choices = get_dropdown_choices(widget)
+        if isinstance(_widget, (Checkbox, Radio)):
+            _widget.button_style = each.button_style
 
-                if isinstance(_widget, Radio):
-                    if key not in results:
-                        results[key] = _widget
-
-                    results[key].number_of_options += 1
-                    continue
+        if isinstance(_widget, Dropdown):
+            _widget.choices = each.choices
 
+        if isinstance(_widget, Radio):
+            if key not in results:
                 results[key] = _widget
 
-    return results
+            results[key].number_of_options += 1
+            continue
 
+        results[key] = _widget
 
-def widget_rect_watermarks(pdf: bytes) -> List[bytes]:
-    """Draws the rectangular border of each widget and returns watermarks."""
-
-    watermarks = []
+    return results
 
-    for page, widgets in get_widgets_by_page(pdf).items():
-        to_draw = []
-        for widget in widgets:
-            rect = widget[ANNOTATION_RECTANGLE_KEY]
-            x = rect[0]
-            y = rect[1]
-            width = abs(rect[0] - rect[2])
-            height = abs(rect[1] - rect[3])
 
-            to_draw.append([x, y, width, height])
-        watermarks.append(
-            create_watermarks_and_draw(pdf, page, "rect", to_draw)[page - 1]
-        )
+def widget_rect_actions(template: TemplateIndex) -> Dict[int, List[Tuple[str, list]]]:
+    """Returns actions drawing the rectangular border of each widget by page."""
 
-    return watermarks
+    return {
+        page: [
+            ("rect", [each.rect[0], each.rect[1], each.width, each.height])
+            for each in widgets
+        ]
+        for page, widgets in template.widgets_by_page.items()
+    }
 
 
 def dropdown_to_text(dropdown: Dropdown) -> Text:
@@ -109,26 +88,55 @@ def dropdown_to_text(dropdown: Dropdown) -> Text:
 
 
 def update_text_field_attributes(
-    template_stream: bytes,
+    template: TemplateIndex,
     widgets: Dict[str, WIDGET_TYPES],
+    font_scope: Union[FontScope, None] = None,
 ) -> None:
-    """Auto updates text fields' attributes."""
-
-    for _, _widgets in get_widgets_by_page(template_stream).items():
-        for _widget in _widgets:
-            key = get_widget_key(_widget)
-
-            if isinstance(widgets[key], Text):
-                if widgets[key].font is None:
-                    widgets[key].font = auto_detect_font(_widget)
-                if widgets[key].font_size is None:
-                    widgets[key].font_size = get_text_field_font_size(
-                        _widget
-                    ) or text_field_font_size(_widget)
-                if widgets[key].font_color is None:
-                    widgets[key].font_color = get_text_field_font_color(_widget)
-                if is_text_multiline(_widget) and widgets[key].text_wrap_length is None:
-                    widgets[key].text_wrap_length = get_paragraph_auto_wrap_length(
-                        _widget, widgets[key]
-                    )
-                    widgets[key].text_lines = get_paragraph_lines(_widget, widgets[key])
+    """Auto updates text fields' attributes, measured with their resolved fonts."""
+
+    for each in template.widgets:
+        key = each.key
+        _widget = widgets[key]
+
+        if isinstance(_widget, Text):
+            if _widget.font is None:
+                _widget.font = each.font
+            if _widget.font_size is None:
+                _widget.font_size = each.font_size
+            if _widget.font_color is None:
+                _widget.font_color = each.font_color
+
+            measured = (
+                font_scope.resolve_widget(_widget)
+                if font_scope is not None
+                else _widget
+            )
+            if _widget.auto_font_size:
+                _widget.font_size = get_auto_font_size(each, measured)
+                measured.font_size = _widget.font_size
+            if each.multiline and _widget.text_wrap_length is None:
+                _widget.text_lines = get_paragraph_lines(each, measured)
+                _widget.text_wrap_length = (
+                    max((len(line) for line in _widget.text_lines), default=0) + 1
+                )
+
+
+def set_widget_values(
+    template: TemplateIndex,
+    widgets: Dict[str, WIDGET_TYPES],
+    data: Dict[str, Union[str, bool, int]],
+    font_scope: Union[FontScope, None] = None,
+) -> Dict[str, WIDGET_TYPES]:
+    """Sets the values of the widgets and prepares them to be filled."""
+
+    for key, value in data.items():
+        if key in widgets:
+            widgets[key].value = value
+
+    for key, value in widgets.items():
+        if isinstance(value, Dropdown):
+            widgets[key] = dropdown_to_text(value)
+
+    update_text_field_attributes(template, widgets, font_scope)
+
+    return widgets
@@ -26,6 +26,9 @@ class Text(Widget):
         self.text_lines = None
         self.text_line_x_coordinates = None
         self.preview = False
+        self.auto_font_size = False
+        self.min_font_size = None
+        self.max_font_size = None
 
     @property
     def schema_definition(self) -> dict:
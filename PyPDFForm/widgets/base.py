@@ -1,14 +1,7 @@
 # -*- coding: utf-8 -*-
 """Contains base class for all widgets to create."""
 
-from io import BytesIO
-from typing import List
-
-from pypdf import PdfReader
 from reportlab.lib.colors import Color
-from reportlab.pdfgen.canvas import Canvas
-
-from ..core.utils import stream_to_io
 
 
 class Widget:
@@ -49,30 +42,3 @@ class Widget:
                 self.acro_form_params[param] = value
             elif user_input in self.NONE_DEFAULTS:
                 self.acro_form_params[param] = None
-
-    def watermarks(self, stream: bytes) -> List[bytes]:
-        """Returns a list of watermarks after creating the widget."""
-
-        pdf = PdfReader(stream_to_io(stream))
-        page_count = len(pdf.pages)
-        watermark = BytesIO()
-
-        canvas = Canvas(
-            watermark,
-            pagesize=(
-                float(pdf.pages[self.page_number - 1].mediabox[2]),
-                float(pdf.pages[self.page_number - 1].mediabox[3]),
-            ),
-        )
-
-        getattr(canvas.acroForm, self.ACRO_FORM_FUNC)(**self.acro_form_params)
-
-        canvas.showPage()
-        canvas.save()
-        watermark.seek(0)
-
-        result = []
-        for i in range(page_count):
-            result.append(watermark.read() if i == self.page_number - 1 else b"")
-
-        return result
@@ -3,33 +3,36 @@
 
 from __future__ import annotations
 
-from typing import BinaryIO, Dict, List, Tuple, Union
+from copy import copy
+from io import BytesIO
+from multiprocessing.context import BaseContext
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple, Union
 from warnings import warn
 
-from .core.constants import DEFAULT_FONT, DEFAULT_FONT_COLOR, DEFAULT_FONT_SIZE
-from .core.coordinate import generate_coordinate_grid
-from .core.filler import fill
-from .core.font import register_font
-from .core.image import any_image_to_jpg, rotate_image
-from .core.utils import (get_page_streams, merge_two_pdfs,
-                         preview_widget_to_draw, remove_all_widgets)
-from .core.watermark import (create_watermarks_and_draw,
-                             merge_watermarks_with_pdf)
+from .core.batch import fill_in_parallel, fill_record, fill_records_combined
+from .core.constants import (DEFAULT_BATCH_CHUNK_SIZE, DEFAULT_FONT,
+                             DEFAULT_FONT_COLOR, DEFAULT_FONT_SIZE)
+from .core.coordinate import get_coordinate_grid_actions
+from .core.filler import fill, get_fill_actions
+from .core.font import FontScope, get_font_memory_usage, register_font
+from .core.image import prepare_image
+from .core.template import TemplateIndex, get_template_index
+from .core.utils import (get_page_streams, merge_pdfs, merge_two_pdfs,
+                         preview_widget_to_draw)
+from .core.watermark import merge_watermark_with_pdf
 from .middleware.adapter import fp_or_f_obj_or_stream_to_stream
 from .middleware.constants import (DEPRECATION_NOTICE,
                                    VERSION_IDENTIFIER_PREFIX,
-                                   VERSION_IDENTIFIERS)
-from .middleware.dropdown import Dropdown
-from .middleware.template import (build_widgets, dropdown_to_text,
-                                  set_character_x_paddings,
-                                  update_text_field_attributes,
-                                  widget_rect_watermarks)
+                                   VERSION_IDENTIFIERS, WIDGET_TYPES)
+from .middleware.template import (build_widgets, set_character_x_paddings,
+                                  set_widget_values, widget_rect_actions)
 from .middleware.text import Text
 from .widgets.checkbox import CheckBoxWidget
 from .widgets.text import TextWidget
 
 
-class PdfWrapper:
+# Every operation on a form is a method of the wrapper, which is the public API.
+class PdfWrapper:  # pylint: disable=R0904
     """A class to represent a PDF form."""
 
     def __init__(
@@ -39,18 +42,128 @@ class PdfWrapper:
     ) -> None:
         """Constructs all attributes for the object."""
 
+        self._template_index = None
+        self._template_stream = None
+        self._pending_actions = {}
+        self._pending_remove_widgets = False
+        self._pending_new_widgets = []
+        self.lazy = kwargs.get("lazy", False)
+        self.font_scope = kwargs.get("font_scope") or FontScope()
+
         self.stream = fp_or_f_obj_or_stream_to_stream(template)
-        self.widgets = build_widgets(self.stream) if self.stream else {}
+        if self.stream:
+            self._template_index = get_template_index(self.stream)
+            self._template_stream = self.stream
+        self.widgets = build_widgets(self._template) if self.stream else {}
 
         self.global_font = kwargs.get("global_font")
         self.global_font_size = kwargs.get("global_font_size")
         self.global_font_color = kwargs.get("global_font_color")
+        self.global_auto_font_size = kwargs.get("global_auto_font_size", False)
+        self.global_min_font_size = kwargs.get("global_min_font_size")
+        self.global_max_font_size = kwargs.get("global_max_font_size")
 
         for each in self.widgets.values():
             if isinstance(each, Text):
-                each.font = self.global_font
-                each.font_size = self.global_font_size
-                each.font_color = self.global_font_color
+                self._set_global_styles(each)
+
+    def _set_global_styles(self, widget: Text) -> None:
+        """Sets the global styles of the object on a text field widget."""
+
+        widget.font = self.global_font
+        widget.font_size = self.global_font_size
+        widget.font_color = self.global_font_color
+        widget.auto_font_size = self.global_auto_font_size
+        widget.min_font_size = self.global_min_font_size
+        widget.max_font_size = self.global_max_font_size
+
+    @property
+    def stream(self) -> bytes:
+        """File stream of the PDF with all deferred operations applied."""
+
+        self._apply_pending()
+
+        return self._stream
+
+    @stream.setter
+    def stream(self, value: bytes) -> None:
+        """Sets the file stream of the PDF."""
+
+        self._stream = value
+
+    @property
+    def widgets(self) -> Dict[str, WIDGET_TYPES]:
+        """Widgets of the PDF including the ones created by deferred operations."""
+
+        if self._pending_new_widgets:
+            self._apply_pending()
+
+        return self._widgets
+
+    @widgets.setter
+    def widgets(self, value: Dict[str, WIDGET_TYPES]) -> None:
+        """Sets the widgets of the PDF."""
+
+        self._widgets = value
+
+    @property
+    def _template(self) -> TemplateIndex:
+        """
+        Parsed template of the current stream, only rebuilt once it changes.
+        Deferred draws are not applied since they don't change the widgets.
+        """
+
+        if self._pending_remove_widgets or self._pending_new_widgets:
+            self._apply_pending()
+
+        if self._template_index is None or self._template_stream is not self._stream:
+            self._template_index = TemplateIndex(self._stream)
+            self._template_stream = self._stream
+
+        return self._template_index
+
+    def _defer(self, actions_by_page: Dict[int, List[Tuple[str, list]]]) -> None:
+        """Queues actions to be drawn once the PDF is materialized."""
+
+        for page, actions in actions_by_page.items():
+            self._pending_actions.setdefault(page, []).extend(actions)
+
+    def _apply_pending(self) -> None:
+        """Materializes all deferred operations in one pass."""
+
+        if not (
+            self._pending_actions
+            or self._pending_remove_widgets
+            or self._pending_new_widgets
+        ):
+            return
+
+        actions = self._pending_actions
+        remove_widgets = self._pending_remove_widgets
+        new_widgets = self._pending_new_widgets
+
+        self._pending_actions = {}
+        self._pending_remove_widgets = False
+        self._pending_new_widgets = []
+
+        self._stream = merge_watermark_with_pdf(
+            self._stream, actions, remove_widgets=remove_widgets
+        )
+        if new_widgets:
+            self._update_widgets(new_widgets)
+
+    def _update_widgets(self, new_widgets: List[Tuple[str, str]]) -> None:
+        """Rebuilds the widgets after new ones are created, keeping existing ones."""
+
+        widgets = build_widgets(self._template)
+        for k, v in self.widgets.items():
+            if k in widgets:
+                widgets[k] = v
+        self.widgets = widgets
+
+        for widget_type, name in new_widgets:
+            if widget_type == "text":
+                self._set_global_styles(self.widgets[name])
 
     def read(self) -> bytes:
         """Reads the file stream of a PDF form."""
@@ -119,21 +232,51 @@ class PdfWrapper:
 
         return new_obj
 
+    @classmethod
+    def merge(
+        cls,
+        pdfs: Iterable[Union[PdfWrapper, bytes, str, BinaryIO]],
+        output: Union[BinaryIO, None] = None,
+    ) -> Union[PdfWrapper, None]:
+        """
+        Merges PDFs into one PDF in a single pass. The result
+        is written straight to output if it is specified.
+        """
+
+        streams = (
+            each.read()
+            if isinstance(each, PdfWrapper)
+            else fp_or_f_obj_or_stream_to_stream(each)
+            for each in pdfs
+        )
+        streams = (each for each in streams if each)
+
+        if output is not None:
+            merge_pdfs(streams, output)
+            return None
+
+        result = BytesIO()
+        merge_pdfs(streams, result)
+        result.seek(0)
+
+        new_obj = cls()
+        new_obj.stream = result.read()
+
+        return new_obj
+
     @property
     def preview(self) -> bytes:
         """Inspects all supported widgets' names for the PDF form."""
 
-        return remove_all_widgets(
-            merge_watermarks_with_pdf(
-                fill(
-                    self.stream,
-                    {
-                        key: preview_widget_to_draw(value)
-                        for key, value in self.widgets.items()
-                    },
-                ),
-                widget_rect_watermarks(self.read()),
-            )
+        actions = get_fill_actions(
+            self._template,
+            {key: preview_widget_to_draw(value) for key, value in self.widgets.items()},
+        )
+        for page, rects in widget_rect_actions(self._template).items():
+            actions[page] += rects
+
+        return merge_watermark_with_pdf(
+            self.stream, actions, self._template.page_sizes, remove_widgets=True
         )
 
     def generate_coordinate_grid(
@@ -141,11 +284,14 @@ class PdfWrapper:
     ) -> PdfWrapper:
         """Inspects a coordinate grid of the PDF."""
 
-        self.stream = generate_coordinate_grid(
-            merge_watermarks_with_pdf(
-                remove_all_widgets(self.read()), widget_rect_watermarks(self.read())
-            ),
-            color,
+        actions = widget_rect_actions(self._template)
+        for page, grid in get_coordinate_grid_actions(
+            self._template.page_sizes, color
+        ).items():
+            actions[page] += grid
+
+        self.stream = merge_watermark_with_pdf(
+            self.read(), actions, self._template.page_sizes, remove_widgets=True
         )
 
         return self
@@ -156,21 +302,94 @@ class PdfWrapper:
     ) -> PdfWrapper:
         """Fills a PDF form."""
 
-        for key, value in data.items():
-            if key in self.widgets:
-                self.widgets[key].value = value
+        set_widget_values(self._template, self.widgets, data, self.font_scope)
+        widgets = self.font_scope.resolve_widgets(self.widgets)
+        if self._stream:
+            widgets = set_character_x_paddings(self._template, widgets)
 
-        for key, value in self.widgets.items():
-            if isinstance(value, Dropdown):
-                self.widgets[key] = dropdown_to_text(value)
+        if self.lazy:
+            widgets = {key: copy(value) for key, value in widgets.items()}
+            self._defer(get_fill_actions(self._template, widgets))
+            self._pending_remove_widgets = True
+        else:
+            self.stream = fill(self._template, widgets)
 
-        update_text_field_attributes(self.stream, self.widgets)
-        if self.read():
-            self.widgets = set_character_x_paddings(self.stream, self.widgets)
+        return self
 
-        self.stream = remove_all_widgets(fill(self.stream, self.widgets))
+    def fill_many(
+        self,
+        records: Iterable[Dict[str, Union[str, bool, int]]],
+    ) -> Iterator[PdfWrapper]:
+        """Fills the PDF form once for each record, yielding a filled copy at a time."""
 
-        return self
+        self._apply_pending()
+        template = self._template
+
+        for record in records:
+            stream, widgets = fill_record(
+                template, self.widgets, record, self.font_scope
+            )
+            result = self._filled_copy(stream)
+            result.widgets = widgets
+
+            yield result
+
+    def fill_combined(
+        self,
+        records: Iterable[Dict[str, Union[str, bool, int]]],
+        chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE,
+    ) -> PdfWrapper:
+        """Fills the PDF form once for each record into a single PDF."""
+
+        self._apply_pending()
+
+        return self._filled_copy(
+            fill_records_combined(
+                self._template, self.widgets, records, chunk_size, self.font_scope
+            )
+        )
+
+    def fill_parallel(
+        self,
+        records: Iterable[Dict[str, Union[str, bool, int]]],
+        workers: Union[int, None] = None,
+        chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE,
+        ordered: bool = True,
+        *,
+        mp_context: Union[BaseContext, None] = None,
+    ) -> Iterator[PdfWrapper]:
+        """Fills the PDF form once for each record using a pool of worker processes."""
+
+        for stream, widgets in fill_in_parallel(
+            self.read(),
+            self.widgets,
+            records,
+            workers,
+            chunk_size=chunk_size,
+            ordered=ordered,
+            font_scope=self.font_scope,
+            mp_context=mp_context,
+        ):
+            result = self._filled_copy(stream)
+            result.widgets = widgets
+
+            yield result
+
+    def _filled_copy(self, stream: bytes) -> PdfWrapper:
+        """Returns a new object of a filled stream without parsing it."""
+
+        result = self.__class__()
+        result.stream = stream
+        result.global_font = self.global_font
+        result.global_font_size = self.global_font_size
+        result.global_font_color = self.global_font_color
+        result.global_auto_font_size = self.global_auto_font_size
+        result.global_min_font_size = self.global_min_font_size
+        result.global_max_font_size = self.global_max_font_size
+        result.lazy = self.lazy
+        result.font_scope = self.font_scope
+
+        return result
 
     def create_widget(
         self,
@@ -183,28 +402,50 @@ class PdfWrapper:
     ) -> PdfWrapper:
         """Creates a new widget on a PDF form."""
 
-        _class = None
-        if widget_type == "text":
-            _class = TextWidget
-        if widget_type == "checkbox":
-            _class = CheckBoxWidget
-        if _class is None:
+        return self.create_widgets([(widget_type, name, page_number, x, y, kwargs)])
+
+    def create_widgets(
+        self,
+        widgets: Iterable[tuple],
+    ) -> PdfWrapper:
+        """
+        Creates new widgets across pages of a PDF form in one pass. Each widget is a
+        tuple of (widget_type, name, page_number, x, y) with an optional params dict.
+        """
+
+        actions = {}
+        new_widgets = []
+        for widget_type, name, page_number, x, y, *params in widgets:
+            _class = None
+            if widget_type == "text":
+                _class = TextWidget
+            if widget_type == "checkbox":
+                _class = CheckBoxWidget
+            if _class is None:
+                continue
+
+            widget = _class(
+                name=name,
+                page_number=page_number,
+                x=x,
+                y=y,
+                **(params[0] if params else {}),
+            )
+            actions.setdefault(page_number, []).append(
+                ("widget", [widget.ACRO_FORM_FUNC, widget.acro_form_params])
+            )
+            new_widgets.append((widget_type, name))
+
+        if not new_widgets:
             return self
 
-        watermarks = _class(
-            name=name, page_number=page_number, x=x, y=y, **kwargs
-        ).watermarks(self.read())
+        if self.lazy:
+            self._defer(actions)
+            self._pending_new_widgets += new_widgets
+            return self
 
-        self.stream = merge_watermarks_with_pdf(self.read(), watermarks)
-        new_widgets = build_widgets(self.read())
-        for k, v in self.widgets.items():
-            if k in new_widgets:
-                new_widgets[k] = v
-        self.widgets = new_widgets
-        if widget_type == "text":
-            self.widgets[name].font = self.global_font
-            self.widgets[name].font_size = self.global_font_size
-            self.widgets[name].font_color = self.global_font_color
+        self.stream = merge_watermark_with_pdf(self.read(), actions)
+        self._update_widgets(new_widgets)
 
         return self
 
@@ -218,26 +459,39 @@ class PdfWrapper:
     ) -> PdfWrapper:
         """Draws a text on a PDF form."""
 
-        new_widget = Text("new")
-        new_widget.value = text
-        new_widget.font = kwargs.get("font", DEFAULT_FONT)
-        new_widget.font_size = kwargs.get("font_size", DEFAULT_FONT_SIZE)
-        new_widget.font_color = kwargs.get("font_color", DEFAULT_FONT_COLOR)
-
-        watermarks = create_watermarks_and_draw(
-            self.stream,
-            page_number,
-            "text",
-            [
-                [
-                    new_widget,
-                    x,
-                    y,
-                ]
-            ],
-        )
+        return self.draw_texts([(text, page_number, x, y, kwargs)])
 
-        self.stream = merge_watermarks_with_pdf(self.stream, watermarks)
+    def draw_texts(
+        self,
+        texts: Iterable[tuple],
+    ) -> PdfWrapper:
+        """
+        Draws texts across pages of a PDF form in one pass. Each text is
+        a tuple of (text, page_number, x, y) with an optional style dict.
+        """
+
+        actions = {}
+        for text, page_number, x, y, *style in texts:
+            style = style[0] if style else {}
+
+            new_widget = Text("new")
+            new_widget.value = text
+            new_widget.font = self.font_scope.resolve(style.get("font", DEFAULT_FONT))
+            new_widget.font_size = style.get("font_size", DEFAULT_FONT_SIZE)
+            new_widget.font_color = style.get("font_color", DEFAULT_FONT_COLOR)
+
+            actions.setdefault(page_number, []).append(
+                (
+                    "text",
+                    [
+                        new_widget,
+                        x,
+                        y,
+                    ],
+                )
+            )
+
+        self._draw(actions)
 
         return self
 
@@ -253,17 +507,42 @@ class PdfWrapper:
     ) -> PdfWrapper:
         """Draws an image on a PDF form."""
 
-        image = fp_or_f_obj_or_stream_to_stream(image)
-        image = any_image_to_jpg(image)
-        image = rotate_image(image, rotation)
-        watermarks = create_watermarks_and_draw(
-            self.stream, page_number, "image", [[image, x, y, width, height]]
-        )
+        return self.draw_images([(image, page_number, x, y, width, height, rotation)])
+
+    def draw_images(
+        self,
+        images: Iterable[tuple],
+    ) -> PdfWrapper:
+        """
+        Draws images across pages of a PDF form in one pass. Each image is a
+        tuple of (image, page_number, x, y, width, height) with an optional rotation.
+        """
+
+        actions = {}
+        for image, page_number, x, y, width, height, *rotation in images:
+            image = prepare_image(
+                fp_or_f_obj_or_stream_to_stream(image), rotation[0] if rotation else 0
+            )
+
+            actions.setdefault(page_number, []).append(
+                ("image", [image, x, y, width, height])
+            )
 
-        self.stream = merge_watermarks_with_pdf(self.stream, watermarks)
+        self._draw(actions)
 
         return self
 
+    def _draw(self, actions_by_page: Dict[int, List[Tuple[str, list]]]) -> None:
+        """Draws actions onto the PDF or defers them in lazy mode."""
+
+        if not actions_by_page:
+            return
+
+        if self.lazy:
+            self._defer(actions_by_page)
+        else:
+            self.stream = merge_watermark_with_pdf(self.stream, actions_by_page)
+
     @property
     def schema(self) -> dict:
         """Generates a json schema for the PDF form template."""
@@ -293,13 +572,34 @@ class PdfWrapper:
 
     @classmethod
     def register_font(
-        cls, font_name: str, ttf_file: Union[bytes, str, BinaryIO]
+        cls, font_name: str, ttf_file: Union[bytes, str, BinaryIO], lazy: bool = False
     ) -> bool:
-        """Registers a font from a ttf file."""
+        """Registers a font from a ttf file, parsing it when first used if lazy."""
 
         ttf_file = fp_or_f_obj_or_stream_to_stream(ttf_file)
 
-        return register_font(font_name, ttf_file) if ttf_file is not None else False
+        return (
+            register_font(font_name, ttf_file, lazy) if ttf_file is not None else False
+        )
+
+    def register_scoped_font(
+        self, font_name: str, ttf_file: Union[bytes, str, BinaryIO], lazy: bool = False
+    ) -> bool:
+        """Registers a font from a ttf file only for the object's font scope."""
+
+        ttf_file = fp_or_f_obj_or_stream_to_stream(ttf_file)
+
+        return (
+            self.font_scope.register(font_name, ttf_file, lazy)
+            if ttf_file is not None
+            else False
+        )
+
+    @classmethod
+    def font_memory_usage(cls) -> Dict[str, int]:
+        """Returns the approximate number of bytes held by each registered font."""
+
+        return get_font_memory_usage()
 
 
 class PyPDFForm(PdfWrapper):
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from pypdf import PdfReader
+from pypdf.generic import TextStringObject
+from reportlab.pdfbase.pdfmetrics import getRegisteredFontNames
+
+from PyPDFForm import FontScope, PdfWrapper
+from PyPDFForm.core import filler, font
+from PyPDFForm.core import image as image_core
+from PyPDFForm.core import template as template_core
+from PyPDFForm.core import utils
+from PyPDFForm.core.cache import LRUCache
+from PyPDFForm.middleware.text import Text
+
+
+def test_lru_cache_evicts_by_count():
+    cache = LRUCache(2)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert len(cache) == 2
+
+
+def test_lru_cache_evicts_by_size():
+    cache = LRUCache(10, 10)
+
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    cache.put("c", 3, 4)
+    assert "a" not in cache
+    assert cache.size == 8
+
+    cache.put("d", 4, 11)
+    assert "d" not in cache
+    assert cache.size == 8
+
+    cache.resize("c", 10)
+    assert "b" not in cache
+    assert cache.size == 10
+    cache.resize("d", 1)
+    assert "d" not in cache
+
+
+def test_lru_cache_stats():
+    cache = LRUCache(10)
+
+    assert cache.get("a") is None
+    cache.put("a", 1, 5)
+    assert cache.get("a") == 1
+    assert cache.stats == {
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+        "count": 1,
+        "size": 5,
+    }
+
+    cache.enabled = False
+    assert cache.get("a") is None
+    cache.enabled = True
+
+    cache.clear()
+    assert cache.stats == {
+        "hits": 0,
+        "misses": 0,
+        "hit_rate": 0,
+        "count": 0,
+        "size": 0,
+    }
+
+
+def test_template_cache_hit(template_stream, data_dict):
+    template_core.TEMPLATE_CACHE.clear()
+
+    obj = PdfWrapper(template_stream)
+    assert template_core.TEMPLATE_CACHE.misses == 1
+
+    another = PdfWrapper(bytes(bytearray(template_stream)))
+    assert template_core.TEMPLATE_CACHE.hits == 1
+    assert another._template is obj._template
+    assert another.widgets is not obj.widgets
+
+    assert (
+        another.fill(data_dict).read()
+        == PdfWrapper(template_stream).fill(data_dict).read()
+    )
+
+    assert template_core.TEMPLATE_CACHE.size == len(template_stream)
+    next(obj.fill_many([data_dict]))
+    assert template_core.TEMPLATE_CACHE.size == len(template_stream) + len(
+        filler.get_fill_plan(obj._template).flattened_stream
+    )
+
+
+def test_layout_cache_hit(sample_template_with_paragraph):
+    value = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 5
+    template_core.LAYOUT_CACHE.clear()
+
+    first, second = PdfWrapper(sample_template_with_paragraph).fill_many(
+        [{"paragraph_1": value}, {"paragraph_1": value}]
+    )
+    misses = template_core.LAYOUT_CACHE.misses
+    assert template_core.LAYOUT_CACHE.hits == misses
+    assert template_core.LAYOUT_CACHE.stats["hit_rate"] == 0.5
+
+    lines = first.widgets["paragraph_1"].text_lines
+    assert lines == second.widgets["paragraph_1"].text_lines
+    assert lines is not second.widgets["paragraph_1"].text_lines
+
+    template_core.LAYOUT_CACHE.enabled = False
+    try:
+        third = next(
+            PdfWrapper(sample_template_with_paragraph).fill_many(
+                [{"paragraph_1": value}]
+            )
+        )
+    finally:
+        template_core.LAYOUT_CACHE.enabled = True
+
+    assert template_core.LAYOUT_CACHE.misses > misses
+    assert third.widgets["paragraph_1"].text_lines == lines
+    assert third.read() == first.read()
+
+
+def test_font_token_index(template_stream):
+    assert font.STANDARD_FONT_TOKENS["/Helv"] == "Helvetica"
+    assert font.STANDARD_FONT_TOKENS["/HeBo"] == "Helvetica-Bold"
+    assert font.STANDARD_FONT_TOKENS["/TiRo"] == "Times-Roman"
+    assert font.STANDARD_FONT_TOKENS["/Symb"] == "Symbol"
+
+    assert font.get_font_by_token("/CoBoOb") == "Courier-BoldOblique"
+    assert "/CoBoOb" in font.FONT_TOKEN_INDEX
+    assert font.get_font_by_token("/F1") is None
+    assert "/F1" in font.FONT_TOKEN_INDEX
+    assert "/Helv" not in font.FONT_TOKEN_INDEX
+
+    font.TEXT_APPEARANCES.clear()
+    template_core.TEMPLATE_CACHE.clear()
+    PdfWrapper(template_stream)
+    assert len(font.TEXT_APPEARANCES)
+
+    value = font.parse_text_appearance("/Helv 12 Tf 0 g")
+    hits = font.TEXT_APPEARANCES.hits
+    assert font.parse_text_appearance("/Helv 12 Tf 0 g") is value
+    assert (
+        font.get_text_appearance({"/DA": TextStringObject("/Helv 12 Tf 0 g")}) is value
+    )
+    assert font.TEXT_APPEARANCES.hits == hits + 2
+
+
+def test_parse_text_appearance():
+    result = font.parse_text_appearance("/TiRo 10.5 Tf 0 0.5 1 rg")
+    assert result == ("/TiRo", 10.5, "rgb", (0, 0.5, 1))
+    assert result.font_color == (0, 0.5, 1)
+    assert font.auto_detect_font(result) == "Times-Roman"
+
+    result = font.parse_text_appearance("0.25 g /HeBo 0 Tf")
+    assert result == ("/HeBo", 0, "gray", (0.25,))
+    assert result.font_color == (0.25, 0.25, 0.25)
+
+    result = font.parse_text_appearance("/F1 12 Tf\n0 1 0 0.5 k")
+    assert result.color_space == "cmyk"
+    assert result.font_color == (0.5, 0, 0.5)
+    assert font.auto_detect_font(result) == "Helvetica"
+
+    assert font.parse_text_appearance("") == font.TextAppearance()
+
+
+def test_register_font_parses_once(
+    font_samples, template_stream, data_dict, monkeypatch
+):
+    # zero padding keeps the font valid but gives it a digest no other test uses
+    with open(os.path.join(font_samples, "LiberationSerif-BoldItalic.ttf"), "rb+") as f:
+        stream = f.read() + b"\0" * 4
+
+    parsed = []
+    ttf_font = font.TTFont
+
+    def counting_ttf_font(*args, **kwargs):
+        parsed.append(kwargs["name"])
+        return ttf_font(*args, **kwargs)
+
+    monkeypatch.setattr(font, "TTFont", counting_ttf_font)
+
+    assert PdfWrapper.register_font("registry_bold_italic", stream)
+    assert PdfWrapper.register_font("registry_bold_italic", stream)
+    assert PdfWrapper.register_font("registry_bold_italic_2", stream)
+    for font_name in ("registry_bold_italic", "registry_bold_italic_2"):
+        assert PdfWrapper(template_stream, global_font=font_name).fill(data_dict)
+    assert parsed == ["registry_bold_italic"]
+    assert "registry_bold_italic" in getRegisteredFontNames()
+    assert "registry_bold_italic_2" in getRegisteredFontNames()
+
+
+def test_register_font_lazy(font_samples, template_stream, data_dict):
+    with open(os.path.join(font_samples, "LiberationSerif-Bold.ttf"), "rb+") as f:
+        stream = f.read()
+
+    assert PdfWrapper.register_font("registry_lazy_bold", stream, lazy=True)
+    assert "registry_lazy_bold" not in getRegisteredFontNames()
+    assert PdfWrapper.font_memory_usage()["registry_lazy_bold"] == len(stream)
+
+    PdfWrapper(template_stream, global_font="registry_lazy_bold").fill(data_dict)
+    assert "registry_lazy_bold" in getRegisteredFontNames()
+    assert PdfWrapper.font_memory_usage()["registry_lazy_bold"] >= len(stream)
+
+    assert PdfWrapper.register_font("registry_lazy_invalid", b"foo", lazy=True)
+    assert not font.load_font("registry_lazy_invalid")
+    assert "registry_lazy_invalid" not in getRegisteredFontNames()
+
+
+def test_font_scopes(
+    font_samples, template_stream, sample_template_with_paragraph, data_dict
+):
+    def base_fonts(obj):
+        return {
+            str(each.get_object()["/BaseFont"]).split("+")[-1]
+            for each in PdfReader(BytesIO(obj.read()))
+            .pages[0]["/Resources"]["/Font"]
+            .values()
+        }
+
+    def scoped_fill(font_file):
+        obj = PdfWrapper(template_stream, global_font="tenant_font")
+        assert obj.register_scoped_font(
+            "tenant_font", os.path.join(font_samples, font_file)
+        )
+        return obj.fill(data_dict)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        bold, italic, *_ = executor.map(
+            scoped_fill,
+            [
+                "LiberationSerif-Bold.ttf",
+                "LiberationSerif-Italic.ttf",
+                "LiberationSerif-Bold.ttf",
+                "LiberationSerif-Italic.ttf",
+            ],
+        )
+
+    assert "tenant_font" not in getRegisteredFontNames()
+    assert "LiberationSerif-Bold" in base_fonts(bold)
+    assert "LiberationSerif-Italic" not in base_fonts(bold)
+    assert "LiberationSerif-Italic" in base_fonts(italic)
+    assert "LiberationSerif-Bold" not in base_fonts(italic)
+    assert (
+        bold.font_scope.fonts["tenant_font"] != italic.font_scope.fonts["tenant_font"]
+    )
+    for each in bold.widgets.values():
+        if isinstance(each, Text):
+            assert each.font == "tenant_font"
+    for each in next(bold.fill_many([data_dict])).widgets.values():
+        if isinstance(each, Text):
+            assert each.font == "tenant_font"
+
+    bold_font = os.path.join(font_samples, "LiberationSerif-Bold.ttf")
+    assert PdfWrapper.register_font("scope_check_bold", bold_font)
+    paragraph = {"paragraph_1": "a paragraph long enough to wrap " * 8}
+    auto_sized = {"test": "a fairly long text which would not fit at its font size"}
+
+    scoped = PdfWrapper(sample_template_with_paragraph, global_font="tenant_font")
+    assert scoped.register_scoped_font("tenant_font", bold_font)
+    expected = PdfWrapper(
+        sample_template_with_paragraph, global_font="scope_check_bold"
+    )
+    assert (
+        scoped.fill(paragraph).widgets["paragraph_1"].text_lines
+        == expected.fill(paragraph).widgets["paragraph_1"].text_lines
+    )
+    assert scoped.widgets["paragraph_1"].font == "tenant_font"
+    assert (
+        next(scoped.fill_many([paragraph])).widgets["paragraph_1"].text_lines
+        == expected.widgets["paragraph_1"].text_lines
+    )
+
+    scoped = PdfWrapper(
+        template_stream, global_font="tenant_font", global_auto_font_size=True
+    )
+    assert scoped.register_scoped_font("tenant_font", bold_font)
+    expected = PdfWrapper(
+        template_stream, global_font="scope_check_bold", global_auto_font_size=True
+    )
+    assert (
+        scoped.fill(auto_sized).widgets["test"].font_size
+        == expected.fill(auto_sized).widgets["test"].font_size
+    )
+    assert scoped.fill_combined([auto_sized]).read()
+    assert [each.read() for each in scoped.fill_parallel([auto_sized], workers=1)]
+
+    scope = FontScope()
+    assert not scope.register("tenant_font", b"foo")
+    assert scope.resolve("tenant_font") == "tenant_font"
+
+
+def test_image_cache_shares_images(template_stream, image_samples):
+    with open(os.path.join(image_samples, "sample_png_image.png"), "rb+") as f:
+        image = f.read()
+    image_core.IMAGE_CACHE.clear()
+
+    obj = PdfWrapper(template_stream).draw_images(
+        [(image, 1, 100, 100, 400, 225), (image, 2, 100, 100, 400, 225)]
+    )
+    obj.draw_image(BytesIO(image), 3, 100, 100, 400, 225)
+    obj.draw_image(image, 3, 100, 400, 100, 50, 90)
+    assert image_core.IMAGE_CACHE.stats["hits"] == 2
+    assert image_core.IMAGE_CACHE.stats["count"] == 2
+
+    merged = PdfWrapper.merge([obj, obj, obj])
+    image_objects = {
+        each.indirect_reference.idnum
+        for page in PdfReader(BytesIO(merged.read())).pages
+        for each in page["/Resources"]["/XObject"].values()
+        if each.get_object()["/Subtype"] == "/Image"
+    }
+    assert len(image_objects) == 2
+    assert len(merged.read()) < len(obj.read()) * 2
+
+    prepared = image_core.prepare_image(image, 0)
+    assert prepared is image_core.prepare_image(image, 0)
+    assert prepared.reader is not prepared.reader
+
+
+def test_merge_pdfs_releases_readers(template_stream, monkeypatch):
+    readers = []
+    pdf_reader = utils.PdfReader
+
+    def tracked_pdf_reader(*args, **kwargs):
+        result = pdf_reader(*args, **kwargs)
+        readers.append(weakref.ref(result))
+        return result
+
+    monkeypatch.setattr(utils, "PdfReader", tracked_pdf_reader)
+
+    def pdfs():
+        for _ in range(3):
+            yield template_stream
+            gc.collect()
+            assert all(each() is None for each in readers[:-1])
+
+    result = BytesIO()
+    utils.merge_pdfs(pdfs(), result)
+    assert len(readers) == 3
+    assert len(PdfReader(result).pages) == 3 * len(
+        PdfReader(BytesIO(template_stream)).pages
+    )
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
 import os
+from io import BytesIO
+
+from pypdf import PdfReader
 
 from PyPDFForm import PdfWrapper
 
@@ -342,3 +345,41 @@ def test_create_widget_sejda_schema(sejda_template):
 
     assert schema["properties"]["new_text_field_widget"]
     assert len(schema["properties"]) == 1
+
+
+def test_create_widgets(template_stream, pdf_samples, request):
+    expected_path = os.path.join(pdf_samples, "widget", "create_widgets.pdf")
+    specs = [
+        ("text", "foo", 1, 100, 100, {"width": 200, "font_size": 20}),
+        ("checkbox", "bar", 2, 100, 100),
+        ("radio", "not_working", 1, 100, 300),
+        ("checkbox", "baz", 1, 300, 300, {"size": 30, "button_style": "cross"}),
+    ]
+    with open(expected_path, "rb+") as f:
+        obj = PdfWrapper(template_stream).create_widgets(specs)
+
+        request.config.results["expected_path"] = expected_path
+        request.config.results["stream"] = obj.read()
+
+        expected = f.read()
+
+        assert len(obj.stream) == len(expected)
+        assert obj.stream == expected
+
+    one_by_one = PdfWrapper(template_stream)
+    for widget_type, name, page_number, x, y, *params in specs:
+        one_by_one.create_widget(
+            widget_type, name, page_number, x, y, **(params[0] if params else {})
+        )
+
+    assert obj.schema == one_by_one.schema
+    assert list(obj.widgets) == list(one_by_one.widgets)
+    filled_pages = PdfReader(
+        BytesIO(obj.fill({"foo": "foo", "bar": True}).read())
+    ).pages
+    expected_pages = PdfReader(
+        BytesIO(one_by_one.fill({"foo": "foo", "bar": True}).read())
+    ).pages
+    for page, expected_page in zip(filled_pages, expected_pages):
+        assert page.extract_text() == expected_page.extract_text()
+        assert not page.annotations
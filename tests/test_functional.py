@@ -1,13 +1,20 @@
 # -*- coding: utf-8 -*-
 
+import multiprocessing
 import os
+from io import BytesIO
 
 import pytest
 from jsonschema import ValidationError, validate
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (ContentStream, DictionaryObject, NameObject,
+                           NumberObject, RectangleObject)
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
 from PyPDFForm import PdfWrapper, PyPDFForm
-from PyPDFForm.core import constants
+from PyPDFForm.core import constants, filler
 from PyPDFForm.core import template as template_core
+from PyPDFForm.core import utils
 from PyPDFForm.middleware.text import Text
 from PyPDFForm.middleware.widget import Widget
 
@@ -513,3 +520,485 @@ def test_generate_coordinate_grid(template_stream, pdf_samples, request):
 
         assert len(obj.read()) == len(expected)
         assert obj.stream == expected
+
+
+def test_template_index(
+    sejda_template,
+    sample_template_with_paragraph,
+    sample_template_with_comb_text_field,
+):
+    index = template_core.TemplateIndex(sejda_template)
+    widgets_by_page = template_core.get_widgets_by_page(sejda_template)
+
+    assert index.page_count == len(widgets_by_page)
+    for page, widgets in widgets_by_page.items():
+        assert len(index.widgets_by_page[page]) == len(widgets)
+        for each, widget in zip(index.widgets_by_page[page], widgets):
+            assert each.page == page
+            assert each.key == template_core.get_widget_key(widget)
+            assert each.type is template_core.get_widget_type(widget)
+            assert each.rect == tuple(
+                float(val) for val in widget[constants.ANNOTATION_RECTANGLE_KEY]
+            )
+            assert not each.multiline
+            assert not each.comb
+            assert each.alignment == int(
+                template_core.get_widget_alignment(widget) or 0
+            )
+            if each.type is Text:
+                assert each.max_length == template_core.get_text_field_max_length(
+                    widget
+                )
+                assert each.font_size
+                assert each.font_color is not None
+            else:
+                assert each.font is None
+            assert not hasattr(each, "__dict__")
+
+    for stream, key, multiline, comb in (
+        (sample_template_with_paragraph, "paragraph_1", True, False),
+        (sample_template_with_comb_text_field, "LastName", False, True),
+    ):
+        each = next(
+            each
+            for each in template_core.TemplateIndex(stream).widgets
+            if each.key == key
+        )
+        assert each.multiline is multiline
+        assert each.comb is comb
+
+
+def test_template_index_reused_across_fill(template_stream, data_dict):
+    obj = PdfWrapper(template_stream)
+    index = obj._template
+
+    assert index.stream == template_stream
+    assert obj._template is index
+
+    obj.fill(data_dict)
+    assert obj._template is not index
+    assert obj._template.stream is obj.read()
+
+
+def test_compiled_patterns(sejda_template):
+    assert utils.compile_pattern(
+        {constants.PARENT_KEY: {constants.WIDGET_TYPE_KEY: "/Tx"}}
+    ) == (((constants.PARENT_KEY, constants.WIDGET_TYPE_KEY), "/Tx"),)
+
+    for widgets in template_core.get_widgets_by_page(sejda_template).values():
+        for widget in widgets:
+            if constants.PARENT_KEY in widget:
+                assert template_core.get_widget_key(widget)
+                assert isinstance(widget[constants.PARENT_KEY], dict)
+
+
+def test_fill_plan(template_with_radiobutton_stream):
+    index = template_core.TemplateIndex(template_with_radiobutton_stream)
+    plan = filler.get_fill_plan(index)
+
+    assert filler.get_fill_plan(index) is plan
+    occurrences = {}
+    for planned in plan.pages.values():
+        for each in planned:
+            assert each.occurrence == occurrences.get(each.widget.key, 0)
+            occurrences[each.widget.key] = each.occurrence + 1
+            if each.button is not None:
+                _to_draw, x, y = each.button
+                assert each.widget.rect[0] <= x <= each.widget.rect[2]
+                assert each.widget.rect[1] <= y <= each.widget.rect[3]
+
+
+def test_fill_many(template_stream, data_dict):
+    records = [
+        data_dict,
+        {"test": "record_2", "check": True},
+        {},
+    ]
+    obj = PdfWrapper(template_stream)
+
+    results = obj.fill_many(iter(records))
+    for record in records:
+        result = next(results)
+        expected = PdfWrapper(template_stream).fill(record)
+        assert result.read() == expected.read()
+        assert result.widgets["test"].value == expected.widgets["test"].value
+
+    assert next(results, None) is None
+    assert obj.read() == template_stream
+    assert all(each.value is None for each in obj.widgets.values())
+
+
+@pytest.mark.parametrize(
+    "fixture, record",
+    [
+        ("sejda_template", "sejda_data"),
+        ("sample_template_with_comb_text_field", {"LastName": "Smith"}),
+        ("sample_template_with_paragraph", {"paragraph_1": "test " * 20}),
+        ("sample_template_with_dropdown", {"dropdown_1": 1}),
+    ],
+)
+def test_fill_many_same_as_fill(fixture, record, request):
+    template = request.getfixturevalue(fixture)
+    if isinstance(record, str):
+        record = request.getfixturevalue(record)
+
+    result = next(PdfWrapper(template).fill_many([record]))
+
+    assert result.read() == PdfWrapper(template).fill(record).read()
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_fill_parallel(sejda_template, sejda_data, ordered):
+    records = [
+        {**sejda_data, "buyer_name": f"name_{i}", "year": str(i)} for i in range(7)
+    ]
+    obj = PdfWrapper(sejda_template)
+    obj.widgets["buyer_name"].font_size = 20
+
+    filled = list(
+        obj.fill_parallel(iter(records), workers=2, chunk_size=2, ordered=ordered)
+    )
+    results = [each.read() for each in filled]
+    expected = [each.read() for each in obj.fill_many(records)]
+
+    if ordered:
+        assert results == expected
+    else:
+        assert sorted(results) == sorted(expected)
+    assert obj.read() == sejda_template
+
+    for each in filled:
+        buyer_name = each.widgets["buyer_name"]
+        assert buyer_name.value == f"name_{each.widgets['year'].value}"
+        assert buyer_name.font_size == 20
+        assert each.schema == obj.schema
+        assert each.sample_data == obj.sample_data
+
+
+def test_fill_parallel_spawn(template_stream, font_samples, data_dict):
+    obj = PdfWrapper(template_stream)
+    assert PdfWrapper.register_font(
+        "new_font_spawn", os.path.join(font_samples, "LiberationSerif-Bold.ttf")
+    )
+    assert obj.register_scoped_font(
+        "scoped_font_spawn", os.path.join(font_samples, "LiberationSerif-Italic.ttf")
+    )
+    obj.widgets["test"].font = "new_font_spawn"
+    obj.widgets["test_2"].font = "scoped_font_spawn"
+
+    results = [
+        each.read()
+        for each in obj.fill_parallel(
+            [data_dict] * 3,
+            workers=2,
+            chunk_size=1,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    ]
+
+    assert results == [each.read() for each in obj.fill_many([data_dict] * 3)]
+    assert obj.widgets["test_2"].font == "scoped_font_spawn"
+
+
+def test_fill_combined(template_stream, pdf_samples, data_dict, request):
+    expected_path = os.path.join(pdf_samples, "sample_filled_combined.pdf")
+    with open(expected_path, "rb+") as f:
+        obj = PdfWrapper(template_stream).fill_combined(
+            [data_dict, {"test": "record_2", "check_2": True}, {}]
+        )
+
+        request.config.results["expected_path"] = expected_path
+        request.config.results["stream"] = obj.read()
+
+        expected = f.read()
+
+        assert len(obj.stream) == len(expected)
+        assert obj.stream == expected
+
+
+def test_fill_combined_same_as_fill_many(sejda_template, sejda_data):
+    def operations(page):
+        result = []
+        for operands, operator in ContentStream(
+            page.get_contents(), page.pdf
+        ).operations:
+            if operator == b"Do" and operands[0] == constants.TEMPLATE_XOBJECT_NAME:
+                xobject = page["/Resources"]["/XObject"][operands[0]].get_object()
+                result += ContentStream(xobject, page.pdf).operations
+            else:
+                result.append((operands, operator))
+
+        # graphics state saves and the clip to the page merge_page adds
+        ignored = [
+            ([1, 0, 0, 1, 0, 0], b"cm"),
+            ([0, 0, *page.mediabox[2:]], b"re"),
+            ([], b"W"),
+            ([], b"n"),
+        ]
+        return [
+            (operands, operator.strip(b"qQ"))
+            for operands, operator in result
+            if operator.strip(b"qQ") and (operands, operator) not in ignored
+        ]
+
+    def base_fonts(page):
+        resources = [page["/Resources"]]
+        for each in page["/Resources"].get("/XObject", {}).values():
+            resources.append(
+                each.get_object().get("/Resources", DictionaryObject()).get_object()
+            )
+
+        return sorted(
+            str(font.get_object()["/BaseFont"])
+            for each in resources
+            for font in each.get("/Font", DictionaryObject()).get_object().values()
+        )
+
+    writer = PdfWriter(clone_from=PdfReader(BytesIO(sejda_template)))
+    for page in writer.pages:
+        page[NameObject("/Rotate")] = NumberObject(90)
+        page[NameObject("/UserUnit")] = NumberObject(2)
+        page[NameObject("/TrimBox")] = RectangleObject([10, 10, 600, 780])
+        page[NameObject("/Group")] = DictionaryObject(
+            {
+                NameObject("/S"): NameObject("/Transparency"),
+                NameObject("/CS"): NameObject("/DeviceRGB"),
+            }
+        )
+    template = BytesIO()
+    writer.write(template)
+
+    records = [
+        {**sejda_data, "buyer_name": f"name_{i}", "year": str(i)} for i in range(5)
+    ]
+    obj = PdfWrapper(template.getvalue())
+
+    combined = PdfReader(BytesIO(obj.fill_combined(records, chunk_size=2).read()))
+    filled = [each.read() for each in obj.fill_many(records)]
+
+    assert len(combined.pages) == len(records) * len(obj._template.page_sizes)
+    assert len(obj.fill_combined(records).read()) < sum(len(each) for each in filled)
+    for i, each in enumerate(filled):
+        for j, page in enumerate(PdfReader(BytesIO(each)).pages):
+            combined_page = combined.pages[i * len(obj._template.page_sizes) + j]
+            for key in constants.COPIED_PAGE_ATTRIBUTES:
+                assert combined_page.get(key) == page.get(key)
+            assert combined_page["/Group"]["/S"] == "/Transparency"
+            assert operations(combined_page) == operations(page)
+            assert base_fonts(combined_page) == base_fonts(page)
+
+
+def test_merge(template_stream, pdf_samples, data_dict, request):
+    expected_path = os.path.join(pdf_samples, "sample_merged_3_copies.pdf")
+    with open(expected_path, "rb+") as f:
+        filled = PdfWrapper(template_stream).fill(data_dict)
+        result = PdfWrapper.merge(
+            [filled, PdfWrapper(), filled.read(), b"", BytesIO(filled.read())]
+        )
+
+        request.config.results["expected_path"] = expected_path
+        request.config.results["stream"] = result.read()
+
+        expected = f.read()
+        assert len(result.read()) == len(expected)
+        assert result.read() == expected
+
+        output = BytesIO()
+        assert PdfWrapper.merge(iter([filled] * 3), output) is None
+        assert output.getvalue() == expected
+
+        added = PdfWrapper()
+        for _ in range(3):
+            added += filled
+        merged_pages = PdfReader(BytesIO(result.read())).pages
+        added_pages = PdfReader(BytesIO(added.read())).pages
+        assert len(merged_pages) == len(added_pages)
+        for merged_page, added_page in zip(merged_pages, added_pages):
+            assert merged_page.extract_text() == added_page.extract_text()
+
+
+def test_merge_paths(pdf_samples):
+    path = os.path.join(pdf_samples, "sample_template.pdf")
+    result = PdfWrapper.merge([path, path])
+
+    assert len(PdfReader(BytesIO(result.read())).pages) == 2 * len(
+        PdfReader(path).pages
+    )
+
+
+def test_lazy_operations(template_stream, image_samples, pdf_samples, request):
+    expected_path = os.path.join(pdf_samples, "sample_lazy_operations.pdf")
+    with open(os.path.join(image_samples, "sample_image.jpg"), "rb+") as _f:
+        image = _f.read()
+
+    def run(obj):
+        return (
+            obj.draw_text("drawn_first", 1, 100, 500)
+            .fill({"test": "test_1", "check": True})
+            .draw_image(image, 1, 100, 100, 400, 225)
+            .draw_text("drawn_last", 2, 100, 100)
+        )
+
+    with open(expected_path, "rb+") as f:
+        obj = run(PdfWrapper(template_stream, lazy=True))
+        assert obj._stream is template_stream
+
+        request.config.results["expected_path"] = expected_path
+        request.config.results["stream"] = obj.read()
+
+        expected = f.read()
+        assert len(obj.read()) == len(expected)
+        assert obj.read() == expected
+        assert obj.stream is obj.read()
+
+        eager = run(PdfWrapper(template_stream))
+        lazy_pages = PdfReader(BytesIO(obj.read())).pages
+        eager_pages = PdfReader(BytesIO(eager.read())).pages
+        assert len(lazy_pages) == len(eager_pages)
+        for lazy_page, eager_page in zip(lazy_pages, eager_pages):
+            assert lazy_page.extract_text() == eager_page.extract_text()
+            assert not lazy_page.annotations
+
+
+def test_lazy_create_widget(template_stream):
+    obj = PdfWrapper(template_stream, lazy=True).create_widget(
+        "text", "new_text", 1, 100, 100
+    )
+    assert obj._stream is template_stream
+
+    assert "new_text" in obj.widgets
+    assert "new_text" in obj._template.widgets_by_page[1][-1].key
+    obj.fill({"new_text": "created"}).create_widget(
+        "checkbox", "new_checkbox", 2, 100, 100
+    )
+
+    assert "created" in PdfReader(BytesIO(obj.read())).pages[0].extract_text()
+    assert list(obj.widgets) == ["new_checkbox"]
+
+
+def test_lazy_fill_snapshots_widgets(template_stream, data_dict):
+    def fill_then_change(obj):
+        obj.fill(data_dict)
+        obj.widgets["test"].font_size = 40
+        obj.widgets["test"].value = "changed"
+        obj.widgets["check"].value = False
+        return obj.read()
+
+    assert fill_then_change(PdfWrapper(template_stream, lazy=True)) == (
+        fill_then_change(PdfWrapper(template_stream))
+    )
+
+
+def test_draw_texts(template_stream, pdf_samples, request):
+    expected_path = os.path.join(pdf_samples, "sample_pdf_with_drawn_texts.pdf")
+    texts = [
+        ("drawn_text_1", 1, 300, 225, {"font_size": 20, "font_color": (1, 0, 0)}),
+        ("drawn_text_2", 2, 100, 100),
+        ("drawn_text_3", 1, 100, 400, {"font": constants.DEFAULT_FONT}),
+    ]
+    with open(expected_path, "rb+") as f:
+        obj = PdfWrapper(template_stream).draw_texts(texts)
+
+        request.config.results["expected_path"] = expected_path
+        request.config.results["stream"] = obj.read()
+
+        expected = f.read()
+
+        assert len(obj.stream) == len(expected)
+        assert obj.stream == expected
+
+    one_by_one = PdfWrapper(template_stream)
+    for text, page_number, x, y, *style in texts:
+        one_by_one.draw_text(text, page_number, x, y, **(style[0] if style else {}))
+    for page, expected_page in zip(
+        PdfReader(BytesIO(obj.read())).pages,
+        PdfReader(BytesIO(one_by_one.read())).pages,
+    ):
+        assert page.extract_text() == expected_page.extract_text()
+
+    assert PdfWrapper(template_stream).draw_texts([]).read() == template_stream
+
+
+def test_draw_images(template_stream, image_samples):
+    with open(os.path.join(image_samples, "sample_image.jpg"), "rb+") as f:
+        image = f.read()
+    png = os.path.join(image_samples, "sample_png_image.png")
+
+    obj = PdfWrapper(template_stream).draw_images(
+        [
+            (image, 1, 100, 100, 400, 225),
+            (png, 2, 100, 100, 400, 225, 90),
+            (BytesIO(image), 2, 100, 400, 100, 50),
+        ]
+    )
+
+    pages = PdfReader(BytesIO(obj.read())).pages
+    assert [len(page.images) for page in pages] == [1, 2, 0]
+
+
+def test_draw_images_lossless(template_stream, image_samples):
+    with open(os.path.join(image_samples, "sample_image.jpg"), "rb+") as f:
+        jpg = f.read()
+    with open(os.path.join(image_samples, "sample_png_image.png"), "rb+") as f:
+        png = f.read()
+
+    obj = PdfWrapper(template_stream).draw_images(
+        [(jpg, 1, 100, 100, 400, 225), (png, 2, 100, 100, 400, 225)]
+    )
+    pages = PdfReader(BytesIO(obj.read())).pages
+
+    jpg_image, png_image = [
+        next(
+            each.get_object()
+            for each in page["/Resources"]["/XObject"].values()
+            if each.get_object()["/Subtype"] == "/Image"
+        )
+        for page in pages[:2]
+    ]
+    assert jpg_image["/Filter"] == "/DCTDecode"
+    assert jpg_image.get_data() == jpg
+    assert png_image["/Filter"] == "/FlateDecode"
+    assert "/SMask" in png_image
+    assert png_image["/SMask"].get_object()["/Filter"] == "/FlateDecode"
+
+
+def test_auto_font_size(template_stream):
+    obj = PdfWrapper(template_stream, global_auto_font_size=True)
+    assert obj._template.widgets[0].key == "test"
+    width = obj._template.widgets[0].width
+    font_size = obj._template.widgets[0].font_size
+    height = next(each.height for each in obj._template.widgets if each.key == "test_2")
+    obj.widgets["test_2"].max_font_size = 30
+    obj.widgets["test_3"].min_font_size = 12
+    obj.fill(
+        {
+            "test": "a fairly long text which would not fit at its font size",
+            "test_2": "short",
+            "test_3": "a much longer text which would need a very small font size to fit "
+            "into the text field",
+        }
+    )
+
+    test = obj.widgets["test"]
+    assert test.font_size < font_size
+    assert stringWidth(test.value, test.font, test.font_size) <= width
+    assert stringWidth(test.value, test.font, test.font_size + 0.2) > width
+    assert height < 30
+    assert (
+        height - constants.AUTO_FONT_SIZE_STEP
+        < obj.widgets["test_2"].font_size
+        <= height
+    )
+    assert obj.widgets["test_3"].font_size == 12
+
+
+def test_auto_font_size_fits_height(template_stream):
+    obj = PdfWrapper(
+        template_stream, global_auto_font_size=True, global_max_font_size=60
+    )
+    assert obj._template.widgets[0].key == "test"
+    height = obj._template.widgets[0].height
+    obj.fill({"test": "hi"})
+
+    assert height < 60
+    assert obj.widgets["test"].font_size <= height
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+from reportlab.pdfbase.pdfmetrics import getFont, stringWidth
+
+from PyPDFForm import PdfWrapper
+from PyPDFForm.core import metrics
+
+TEXT = "Lorem ipsum, dolor sit amet. WWW iii éΩ✓"
+
+
+@pytest.fixture
+def ttf_font(font_samples):
+    PdfWrapper.register_font(
+        "LiberationSerif-Regular",
+        os.path.join(font_samples, "LiberationSerif-Regular.ttf"),
+    )
+    return "LiberationSerif-Regular"
+
+
+@pytest.mark.parametrize("font_size", [8, 12, 13.5])
+@pytest.mark.parametrize("font", ["Helvetica", "Courier-Bold", "ttf_font"])
+def test_text_widths_same_as_string_width(font, font_size, request):
+    if font == "ttf_font":
+        font = request.getfixturevalue(font)
+
+    widths = metrics.TextWidths(TEXT, font, font_size)
+
+    assert len(widths) == len(TEXT)
+    assert metrics.text_width(TEXT, font, font_size) == stringWidth(
+        TEXT, font, font_size
+    )
+    for i in range(len(TEXT) + 1):
+        assert widths.width(0, i) == stringWidth(TEXT[:i], font, font_size)
+
+
+def test_fitting_length():
+    widths = metrics.TextWidths(TEXT, "Helvetica", 12)
+
+    for start in range(len(TEXT)):
+        for max_width in (0, 1, 10, 55.5, 100, 1000):
+            expected = 0
+            while start + expected < len(TEXT) and (
+                stringWidth(TEXT[start : start + expected + 1], "Helvetica", 12)
+                <= max_width
+            ):
+                expected += 1
+            assert widths.fitting_length(max_width, start) == expected
+
+
+def test_glyph_widths_cached_per_font():
+    glyphs = metrics.get_glyph_widths("Helvetica")
+    assert metrics.get_glyph_widths("Helvetica") is glyphs
+
+    metrics.text_width("abc", "Helvetica", 12)
+    assert {"a", "b", "c"} <= set(glyphs.widths)
+
+    stale = metrics.GlyphWidths(getFont("Courier"))
+    metrics.GLYPH_WIDTHS["Helvetica"] = stale
+    assert metrics.get_glyph_widths("Helvetica") is not stale
+    assert metrics.text_width("abc", "Helvetica", 12) == stringWidth(
+        "abc", "Helvetica", 12
+    )
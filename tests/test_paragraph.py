@@ -3,6 +3,8 @@
 
 import os
 
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
 from PyPDFForm import PdfWrapper
 
 
@@ -219,3 +221,57 @@ def test_paragraph_max_length(
         if os.name != "nt":
             assert len(obj.stream) == len(expected)
             assert obj.stream == expected
+
+
+def test_paragraph_lines_fit_width(sample_template_with_paragraph):
+    value = (
+        "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+        "xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx"
+        "\n\nSed do  eiusmod tempor incididunt ut labore et dolore magna aliqua."
+    )
+    obj = PdfWrapper(sample_template_with_paragraph)
+    width = obj._template.widgets[2].width
+    widget = obj.fill({"paragraph_1": value}).widgets["paragraph_1"]
+    lines = widget.text_lines
+
+    assert lines[-1].endswith("magna aliqua.")
+    assert "" in lines
+    assert widget.text_wrap_length == max(len(each) for each in lines) + 1
+    for i, line in enumerate(lines):
+        assert stringWidth(line, widget.font, widget.font_size) <= width
+        assert line == line.rstrip(" ")
+        if i + 1 < lines.index("") and " " in lines[i + 1]:
+            next_word = lines[i + 1].split(" ")[0]
+            assert (
+                stringWidth(f"{line} {next_word}", widget.font, widget.font_size)
+                > width
+            )
+    assert "".join(lines).replace(" ", "") == value.replace(" ", "").replace("\n", "")
+
+
+def test_paragraph_auto_font_size(sample_template_with_paragraph, pdf_samples, request):
+    expected_path = os.path.join(
+        pdf_samples, "paragraph", "test_paragraph_auto_font_size.pdf"
+    )
+    with open(expected_path, "rb+") as f:
+        obj = PdfWrapper(sample_template_with_paragraph, global_auto_font_size=True)
+        height = obj._template.widgets[2].height
+        obj.fill(
+            {
+                "paragraph_1": "Lorem ipsum dolor sit amet, consectetur adipiscing elit, "
+                "sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. "
+                * 6
+            }
+        )
+
+        request.config.results["expected_path"] = expected_path
+        request.config.results["stream"] = obj.read()
+
+        expected = f.read()
+
+        assert len(obj.stream) == len(expected)
+        assert obj.stream == expected
+
+        widget = obj.widgets["paragraph_1"]
+        assert 4 < widget.font_size < 14
+        assert len(widget.text_lines) * widget.font_size * 1.2 <= height